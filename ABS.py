@@ -12,6 +12,10 @@ The ABS module considers building layouts and agents' movements, factoring in de
 The module employs a grid-based approach for swift and effective simulation. 
 It also utilizes the networkX library to generate a graph of the building and 
 efficiently track agents' locations, assigning them optimal paths between locations.
+The cells (nodes) are identified by the integer ids i*h+j, where h is the number of columns
+of the layout; the "i, j" node names are still accepted through model.node_name and model.name_to_node.
+The graph is held by a graph backend (see graph_backend.py): a scipy.sparse CSR matrix by default,
+or the networkX graph.
 
 The ABS module includes two primary classes: Model, which creates the simulation environment, 
 and Agent, which models individual agents. The module uses the matplotlib library to animate 
@@ -29,10 +33,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib import animation
 import datetime
+from graph_backend import make_graph_backend
 
 
 class model():
-    def __init__(self,layout,start_date: datetime.datetime, time_step):
+    def __init__(self,layout,start_date: datetime.datetime, time_step, graph_backend="csr"):
         '''
         Create the model with the specified start date and the time step expressed in seconds; then,
         Create the model grid from layout, the layout is a numpy array representing cells
@@ -41,9 +46,11 @@ class model():
         2: a block right of the cell
         3: a block under and right of a cell 
         0: no block under or right of the cell
+        graph_backend:
+            "csr" holds the graph in a scipy.sparse matrix, "networkx" in a networkx.Graph
         '''
         self.layout=layout
-        self.graph=self.make_graph()
+        self.graph=make_graph_backend(self,graph_backend)
         self.agents=[] # a dictionary with  node name and list of agents in that position
         self.now = start_date
         self.start_time = start_date
@@ -51,43 +58,68 @@ class model():
 
     def make_graph(self):
         '''
-        creates a graph for the layout in which the node names are 
-        represented as "i,j", where i is the row number and j is the column number
+        creates a graph for the layout in which the nodes are the integer ids i*h+j,
+        where i is the row number, j is the column number and h is the number of columns
         '''
         a=self.layout
         w,h=a.shape
         g=nx.Graph()
         
         #adding nodes to the network
-        for i in range(w+1):
-            for j in range(h+1):
-                    g.add_node(str(i)+', '+str(j),pos=(i,j))
+        for i in range(w):
+            for j in range(h):
+                    g.add_node(i*h+j,pos=(i,j))
         #adding edges to the network
         for i in range(w):
             for j in range(h):
                 if  a[i,j]==0:
                     if j+1<h:
-                        g.add_edge(str(i)+', '+str(j),str(i)+', '+str(j+1),weight=1)
+                        g.add_edge(i*h+j,i*h+j+1,weight=1)
                     if i+1<w:
-                        g.add_edge(str(i)+', '+str(j),str(i+1)+', '+str(j),weight=1)
-                if  a[i,j]==2: #there is a wall on the right of the cell
-                    g.add_edge(str(i)+', '+str(j),str(i)+', '+str(j+1),weight=1)
-                if  a[i,j]==1:#there is a wall under the cell
-                    g.add_edge(str(i)+', '+str(j),str(i+1)+', '+str(j),weight=1)
+                        g.add_edge(i*h+j,(i+1)*h+j,weight=1)
+                if  a[i,j]==2 and j+1<h: #there is a wall on the right of the cell
+                    g.add_edge(i*h+j,i*h+j+1,weight=1)
+                if  a[i,j]==1 and i+1<w:#there is a wall under the cell
+                    g.add_edge(i*h+j,(i+1)*h+j,weight=1)
                 
                 if i+1<w and j+1<h:
                     if a[i,j]==0  and (a[i,j+1]==0 or a[i,j+1]==1) and (a[i+1,j]==2 or a[i+1,j]==0) and a[i+1,j]!=4:
-                        g.add_edge(str(i)+', '+str(j),str(i+1)+', '+str(j+1),weight=1.414)
+                        g.add_edge(i*h+j,(i+1)*h+j+1,weight=1.414)
                 if i+1<w and j>0:
                     if a[i,j-1]==0  and (a[i,j]==1 or a[i,j]==0) and (a[i+1,j-1]==0 or a[i+1,j-1]==2) and a[i+1,j]!=4:
-                        g.add_edge(str(i)+', '+str(j),str(i+1)+', '+str(j-1),weight=1.414)
+                        g.add_edge(i*h+j,(i+1)*h+j-1,weight=1.414)
 
         for i in range(w):
             for j in range(h):
                 if a[i,j]==4:
-                    g.remove_node(str(i)+', '+str(j))
+                    g.remove_node(i*h+j)
         return g
 
+    def node_id(self,pos):
+        '''
+        returns the id of the node at position (i, j)
+        '''
+        return int(pos[0])*self.layout.shape[1]+int(pos[1])
+
+    def position(self,node):
+        '''
+        returns the position (i, j) of a node id
+        '''
+        return divmod(int(node),self.layout.shape[1])
+
+    def node_name(self,node):
+        '''
+        returns the "i, j" name of a node id
+        '''
+        return str(self.position(node)).strip("()")
+
+    def name_to_node(self,name):
+        '''
+        returns the node id of an "i, j" node name
+        '''
+        i,j=name.split(',')
+        return self.node_id((i,j))
+
 
     def plot_layout(self,ax,color='green',blocksize=12):
         a=self.layout
@@ -107,8 +139,9 @@ class model():
         return ax
     
     def plot_graph(self,node_size=100):
-        pos=nx.get_node_attributes(self.graph,'pos')
-        nx.draw(self.graph,pos,node_size=node_size)
+        g=self.graph.to_networkx()
+        pos=nx.get_node_attributes(g,'pos')
+        nx.draw(g,pos,node_size=node_size)
         return plt
     
     def plot_agents(self,size=10):
@@ -120,9 +153,10 @@ class model():
     
     def agent_array(self,cond='True'):
         r=np.zeros(self.layout.shape)
+        cond=compile(cond,'<cond>','eval')
         for agent in self.agents:
             if  eval(cond):
-                r[eval(agent.node)]+=1
+                r[self.position(agent.node)]+=1
         return r
 
     def step(self):
@@ -168,29 +202,35 @@ class model():
 
 
 class agent:
-    def __init__(self,model,id,node:str,speed=1,marker='o',color='r',size=10,alpha=1):
+    def __init__(self,model,id,node,speed=1,marker='o',color='r',size=10,alpha=1):
         '''
-        node:str
-            postion of the agent as a node name lie "i,j"
+        node:
+            postion of the agent as a node id, or a node name like "i,j"
         id:
             id of the agent
         '''
+        if isinstance(node,str):
+            node=model.name_to_node(node)
         self.model=model
         self.id=id
         self.marker=marker
         self.color=color
         self.size=size
         self.speed=speed
-        self.pos=eval(node)
+        self.pos=model.position(node)
         self.node=node
         model.agents.append(self)
         self._id_in_path=0
-        self._path=[]
+        self._path=np.zeros(0,dtype=np.int32)
         self.alpha=alpha
         self.active=True
 
     def set_path(self,path):
-        self._path=path
+        '''
+        path is the sequence of node ids that the entity should move on it,
+        it is kept as an int32 array
+        '''
+        self._path=np.asarray(path,dtype=np.int32)
         self._id_in_path=0
 
     def walk(self):
@@ -202,12 +242,12 @@ class agent:
         '''
         
         self._id_in_path+=self.speed
-        if self._path==[]:
+        if len(self._path)==0:
             self.set_path([self.node])
         if self._id_in_path>len(self._path)-1:
             self._id_in_path=len(self._path)-1
-        self.node=self._path[int(self._id_in_path)]
-        self.pos=eval(self.node)
+        self.node=int(self._path[int(self._id_in_path)])
+        self.pos=self.model.position(self.node)
 
     def step(self):
         pass
@@ -216,5 +256,12 @@ class agent:
         nnodes=self.model.graph.neighbors(self.node)
         l=[]
         for n in nnodes:
-            l.append(str(n))
+            l.append(n)
         return l
+
+    @property
+    def node_name(self):
+        '''
+        position of the agent as a node name like "i, j"
+        '''
+        return self.model.node_name(self.node)
@@ -38,33 +38,50 @@ from ABS import agent, model
 import random 
 import scipy.stats as st
 import numpy as np
-import networkx as nx
 import matplotlib.pyplot as plt
 import datetime
 import math
 from matplotlib import animation
 import matplotlib.dates as mdates
+from variates import VariatePool
+from array_engine import ArrayEngine
+import exposure
+from work_calendar import WorkCalendar, DAY_SECONDS
+from paths import shared_path_service
+from profiler import PhaseProfiler, format_report
+from event_log import EventLog
+import event_log
+import checkpoint
+
+REGION_TRIM_STEPS=10 #steps between the trims of the active region of the quanta (see CovidModel.trim_active_region)
+QUANTA_CUTOFF=1e-6 #default concentration below which the quanta are dropped when no agent emits (see CovidModel.clear_quanta_below_cutoff)
 
 def time_cal(start:datetime.datetime, hours, minutes=0, seconds=0):
         start = datetime.datetime(2022, 1, 1, start.hour, start.minute, start.second)
         end = start + datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
         return end.time()
 
-def Random_Decider(rand):
-        random_decider = random.uniform(0, 1)
+def Random_Decider(rand, variates=None, key="uniform", stream=random):
+        if variates is None:
+            random_decider = stream.uniform(0, 1)
+        elif rand <= 0: #no need to draw a value when the event is impossible
+            return False
+        else:
+            random_decider = variates.rvs(key)
         return True if random_decider <= rand else False
 
 
-def random_location_selector(loc_array):
+def random_location_selector(loc_array, stream=random):
      loc=loc_array
-     j=random.randint(0,len(loc[0])-1)
+     j=stream.randint(0,len(loc[0])-1)
      return (loc[0][j],loc[1][j])
 
 class CovidModel(model):
     
     def __init__(self, layout,start_date,ventilation_efficiency, infection_rate=[0,0], workhours_per_day=8, \
                   interventions={"mask":[95,95],"test":[1, 60, 14],"isolation":5},\
-                workdays= 5, ghatherings = [],time_step=1,grid_size=1.5):
+                workdays= 5, ghatherings = [],time_step=1,grid_size=1.5, seed=None, engine="agents", quanta_cutoff=QUANTA_CUTOFF, path_cache=None, graph_backend="csr", replicates=None,\
+                common_random_numbers=False, profile=False, region_cutoff=0, field_dtype=np.float64, emission_profile="step", event_verbosity=1):
         '''
         inputs:
         num_teams: number of all the workers on the site, the same as the number of agents
@@ -83,8 +100,63 @@ class CovidModel(model):
             "mask":[mask efficiency, mask compliance], 
             "vaccination":[vaccination efficiency, vaccination compliance]
             "test":[interval between tests in days,test accuracy in percentage,isolation duration]
+        seed:
+            seed of the variate pool used by the agents; if None, the seed is drawn from numpy's
+            global random state so that np.random.seed() still makes the runs reproducible
+        engine:
+            "agents" runs the step of each CovidAgent object in each time step,
+            "array" advances all the agents at once using the structure-of-arrays ArrayEngine, where only
+            the agents whose stay ends and the walking agents run their state machine in a time step
+        quanta_cutoff:
+            when no infected agent emits quanta, the quanta matrix is set to zero as soon as the
+            concentration of all cells falls below this value, and the decay and spread are skipped until
+            an agent emits again; this biases the inhaled quanta down by at most 4*quanta_cutoff times the
+            inhalation rate in each time step (about 1.3e-4 quanta in a 9.5 hour day with the default 1e-6);
+            0 keeps the quanta until they are exactly zero
+        path_cache:
+            directory in which the shortest paths of the layout are saved and loaded (see paths.py),
+            None keeps them in memory only; in both cases the paths are shared by all the models of the same layout
+        region_cutoff:
+            the decay and spread of the quanta only update the active region, the bounding box of the cells that
+            may hold quanta, grown by one cell in each time step; every few steps, the cells outside the bounding box of
+            the cells whose concentration in a channel is at least region_cutoff are set to zero and the region shrinks to it;
+            0 only drops the cells that are exactly zero, which gives the same results as updating the whole layout
+        field_dtype:
+            floating point type of the quanta matrix, the total quanta, total inhaled and infection matrices and the
+            buffers of the spread; np.float32 halves their memory, and the sums that grow during the whole run (total
+            quanta, total inhaled and infection matrices) are then accumulated with Kahan's compensated summation
+            (see exposure.compensated_add); precision.compare_field_dtypes compares the results with np.float64
+        emission_profile:
+            "step" draws the viral load, the ci factor, the inhalation rate and the particle number factor of each
+            infected agent in every time step; "daily" draws them once for each day of the infection of the agent (and
+            for each activity and face of the agent in that day) and keeps them in the emission profile of the agent,
+            so that the emission in a time step is a lookup (see CovidAgent.emission_profile); the mask is still
+            decided in every time step
+        graph_backend:
+            "csr" finds the paths with scipy.sparse.csgraph, "networkx" with networkx (see graph_backend.py);
+            both find shortest paths, but they may choose different paths of the same length
+        replicates:
+            number of replicates run together by the model (batched Monte Carlo simulation, needs the array engine);
+            the quanta matrix is then (W, H, 4, R), the total quanta, total inhaled and infection matrices are (W, H, R),
+            add_crew creates a copy of each agent for each replicate and each replicate has its own daily infection report;
+            None runs a single realisation with the usual (W, H, 4) and (W, H) matrices
+        common_random_numbers:
+            draw the random numbers of each purpose (task choice, gatherings, infections, masks, emissions,
+            population and interventions) from its own stream derived from the seed (see variates.py), so that
+            the scenarios run with the same seed use the same random numbers; the seed should then be given;
+            the task choice and infection draws of each agent have their own streams, identified by the "key"
+            of its crew (e.g. its desk) or by its number
+        profile:
+            time the phases of each time step and count the path table hits and searches (see profiler.py),
+            the report of each run of myrun is printed and kept in self.profiler.reports
+        event_verbosity:
+            the infections, isolations and returns to work are kept in the event log self.events (see event_log.py);
+            0 keeps no events, 1 keeps them and 2 also prints each event
         '''
         self.site_width,self.site_height=layout.shape
+        if replicates is not None and engine!="array":
+            raise ValueError("replicates can only be used with the array engine")
+        self.replicates=replicates
         self.grid_size=grid_size
         self.time_step=time_step
         self.gravitational_settleing=np.array([0.9999658,0.99984729,0.99944496,0.99866597])**self.time_step
@@ -102,8 +174,29 @@ class CovidModel(model):
         self.N=np.array([0.084,0.009,0.003,0.002]) #arosel emmission for different channels when breathing
         self.V=np.array([2.14,24.42,179.59,696.91])*1e-8
         self.N_factor={1:st.uniform(1,1),2:st.uniform(1.5,3.4-1.5),3:st.uniform(20,30-20)} #number of particles based on task
+
+        #the clock of the simulation is the integer tick, in seconds from the midnight of the start date (see now)
+        self._midnight=start_date.replace(hour=0,minute=0,second=0,microsecond=0)
+
+        #pre-drawn random variates for the distributions used in each step
+        if seed is None:
+            seed=np.random.randint(0,2**31-1)
+        self.common_random_numbers=common_random_numbers
+        self.variates=VariatePool(seed,streams=common_random_numbers)
+        self.variates.register("uniform",st.uniform(0,1))
+        self.variates.register("task",st.uniform(0,1),shared="uniform") #choice of the next task
+        self.variates.register("mask",st.uniform(0,1),shared="uniform") #mask compliance
+        self.variates.register("ci",self.ci)
+        self.variates.register("sympotom_development",self.sympotom_development)
+        for k in self.viral_load:
+            self.variates.register(("viral_load",k),self.viral_load[k])
+        for k in self.IR:
+            self.variates.register(("IR",k),self.IR[k])
+        for k in self.N_factor:
+            self.variates.register(("N_factor",k),self.N_factor[k])
         
-        super().__init__(layout, start_date=start_date, time_step=time_step)
+        super().__init__(layout, start_date=start_date, time_step=time_step, graph_backend=graph_backend)
+        self.paths=shared_path_service(self.graph,self.layout,path_cache)
         self.ventilation_efficiency = ventilation_efficiency # determines how much volume of fresh air (or sanitized air) is blown into the space in each hour (measured as the proportion of the space volume)
         
         self.infection_rate = infection_rate[0]
@@ -112,20 +205,39 @@ class CovidModel(model):
         self.site_workhours[1]=datetime.timedelta(hours=self.site_workhours[1].hour,minutes=self.site_workhours[1].minute)
         self.workdays = workdays
         self.workhours_per_day = workhours_per_day 
+        self._day_start=self.tick #ticks of the start time in each day
+        self._closing_jump=DAY_SECONDS-round(self.workhours_per_day*3600)-self.time_step #from the end of the working hours to the step before the next start
         self.gatherings=ghatherings
         for gathering in self.gatherings:
             gathering["happened"]=False
+            self.paths.add_locations(zip(*gathering["location"]))
+        self._gathering_starts=[g["start"].hour*3600+g["start"].minute*60+g["start"].second for g in self.gatherings] #in seconds of the day
+        self.calendar=None
         #isolation 
         self.isolation_loc = (self.site_width  - 1, self.site_height - 1)
-        self.isolation_node=str(self.isolation_loc).strip("()")
+        self.isolation_node=self.node_id(self.isolation_loc)
         
        
         
         ### Virus content and infected people
-        self.quanta_matrix=np.zeros([self.site_width, self.site_height,4],dtype=np.float64) #considering four channels
+        self._field_shape=[self.site_width, self.site_height] if replicates is None else [self.site_width, self.site_height, replicates]
+        self.field_dtype=np.dtype(field_dtype)
+        self.quanta_matrix=np.zeros([self.site_width, self.site_height,4]+self._field_shape[2:],dtype=self.field_dtype) #considering four channels
         self.total_quanta=self.quanta_matrix[:,:,0]+self.quanta_matrix[:,:,1]+self.quanta_matrix[:,:,2]+self.quanta_matrix[:,:,3]
         self.total_inhaled_matrix=self.total_quanta.copy()
-        self.infection_matrix=np.zeros([self.site_width, self.site_height],dtype=np.float64)
+        self.quanta_cutoff=quanta_cutoff
+        self._quanta_zero=True #all the quanta matrix is zero, the decay and spread can be skipped
+        self._quanta_emitted=False #an agent emitted quanta since the last decay and spread
+        #active region of the quanta: [first row, last row+1, first column, last column+1] of a box out of which all
+        #the quanta are zero, None if the quanta matrix is zero (see advance_quanta)
+        self._active_region=None
+        self.region_cutoff=region_cutoff
+        self._region_steps=0 #steps since the active region was trimmed
+        self.infection_matrix=np.zeros(self._field_shape,dtype=self.field_dtype)
+        #low-order parts lost by the sums of the total quanta, total inhaled and infection matrices in single precision
+        self._compensation=None
+        if self.field_dtype!=np.float64:
+            self._compensation={name:np.zeros(self._field_shape,dtype=self.field_dtype) for name in ("total_quanta","total_inhaled_matrix","infection_matrix")}
         self.mortality = []
         self.simulated_days=[]
         
@@ -143,20 +255,82 @@ class CovidModel(model):
         self.right_spread=8e-4/self.grid_size*self.ventilation_efficiency/4*right_spread[0]*self.time_step
         self.up_spread=8e-4/self.grid_size*self.ventilation_efficiency/4*up_spread[0]*self.time_step
         self.down_spread=8e-4/self.grid_size*self.ventilation_efficiency/4*down_spread[0]*self.time_step
+
+        #preallocated buffers for the fused decay and spread of all channels (see advance_quanta),
+        #the rows are processed in blocks of about 32k values so that the buffers stay in the cache;
+        #the channels of all replicates are handled as 4*R channels of a (W, H, 4*R) view of the quanta matrix
+        channels=4 if replicates is None else 4*replicates
+        self._spread_block_rows=int(min(self.site_width,max(1,262144//self.field_dtype.itemsize//(self.site_height*channels))))
+        self._spread_buffers=np.zeros([6,self._spread_block_rows+2, self.site_height,channels],dtype=self.field_dtype)
+        self._previous_row=np.zeros([self.site_height,channels],dtype=self.field_dtype) #last decayed row of the previous block
+        self._channel_sum=np.zeros(self._field_shape,dtype=self.field_dtype)
+        #decay of each channel and (W, H, 1) views of the spread coefficients, broadcast over the channels
+        self._channel_decay=np.repeat(self.inactivation*self.gravitational_settleing,channels//4).astype(self.field_dtype)
+        self._channel_spread=[c[:,:,None].astype(self.field_dtype,copy=False) for c in (self.left_spread,self.right_spread,self.up_spread,self.down_spread)]
        
         #*****Interventions*****
         self.interventions = interventions
         self.mask_compliance = 0
         self.mask_efficiency = 0.0 #determines the efficiency of the mask worn by each agent; 0 for no maks.
         if "mask" in self.interventions:
-            self.mask_efficiency = self.interventions["mask"][0].rvs() / 100
+            self.mask_efficiency = self.interventions["mask"][0].rvs(random_state=self.variates.generator("interventions")) / 100
             self.mask_compliance = self.interventions["mask"][1] / 100
-        self.daily_infection_report={self.now.date():0}
+        #daily infections of each replicate, the column of a day is its day ordinal (days from the start date) minus
+        #first_report_day; the dates of the reported days are listed in the daily infection reports (see infection_report)
+        self.first_report_day=-1
+        self.daily_infections=np.zeros([replicates or 1,16],dtype=np.int64)
+        self._reported_days=np.zeros(self.daily_infections.shape,dtype=bool)
+        self._reported_days[:,-self.first_report_day]=True
+
+        if engine not in ("agents","array"):
+            raise ValueError("engine should be either 'agents' or 'array'")
+        if emission_profile not in ("step","daily"):
+            raise ValueError("emission_profile should be either 'step' or 'daily'")
+        self.emission_profile=emission_profile
+        self.engine=engine
+        self.array_engine=None
+        self.profiler=PhaseProfiler() if profile else None
+        self.events=EventLog(event_verbosity,start=self._midnight)
+
+    @property
+    def now(self):
+        """
+        the current time as a datetime; the simulation runs on the integer clock self.tick
+        """
+        return self._midnight+datetime.timedelta(seconds=self.tick)
+
+    @now.setter
+    def now(self,value):
+        self.tick=round(self.time_to_tick(value))
+
+    @property
+    def day(self):
+        """
+        day ordinal of the current time, 0 for the start date
+        """
+        return int(self.tick//DAY_SECONDS)
+
+    def time_to_tick(self,time):
+        """
+        returns the tick of a datetime, in seconds from the midnight of the start date
+        """
+        return (time-self._midnight).total_seconds()
+
+    def tick_to_time(self,tick):
+        """
+        returns the datetime of a tick
+        """
+        return self._midnight+datetime.timedelta(seconds=tick)
 
   
     def add_crew(self,crew):
+        """
+        adds the agents of a crew and returns them; with replicates, a copy of the crew
+        is added for each replicate and the agents are returned replicate by replicate
+        """
         agents=[]
-        for i in range(crew["crew size"]):
+        self.paths.add_routes([t[0] for t in crew['tasks']])
+        for i in range(crew["crew size"]*(self.replicates or 1)):
             if "vaccine" in self.interventions:
                 a=CovidAgent(self, id,crew['tasks'],crew["shift"],\
                     vaccination=self.interventions["vaccine"]) #create a new convidAgent
@@ -169,32 +343,90 @@ class CovidModel(model):
                 a.color=crew["color"]
             if "speed" in crew:
                 a.speed=crew['speed']
-            if Random_Decider(self.infection_rate):
-                a.get_infected(self.now)
+            a.replicate=i//crew["crew size"]
+            if "key" in crew: #the streams of the agent follow the key of the crew, e.g. its desk
+                a.stream_key=(crew["key"],i%crew["crew size"])
+            if Random_Decider(self.infection_rate,stream=self.variates.stream("population")):
+                a.infect_at(self.tick,add=False,source=event_log.INITIAL)
             a.active=False
             agents.append(a)
         return agents
 
 
+    def get_array_engine(self):
+        """
+        returns the ArrayEngine of the model (None if the agents engine is used),
+        the engine is created again if agents are added to the model
+        """
+        if self.engine!="array":
+            return None
+        if self.array_engine is None or self.array_engine.n!=len(self.agents):
+            self.array_engine=ArrayEngine(self)
+        return self.array_engine
+
+    def get_calendar(self):
+        """
+        returns the WorkCalendar of the model,
+        the calendar is created again if agents are added to the model
+        """
+        if self.calendar is None or self.calendar.n!=len(self.agents):
+            self.calendar=WorkCalendar(self)
+        return self.calendar
+
+    def save_checkpoint(self,file_name):
+        """
+        saves the state of the model in a checkpoint file (see checkpoint.py)
+        """
+        checkpoint.save_checkpoint(self,file_name)
+
+    def load_checkpoint(self,file_name,restore_random=True):
+        """
+        restores the state saved in a checkpoint file, the model should be built with the same
+        settings as the saved one and have no agents; the agents are created from the checkpoint
+        """
+        return checkpoint.load_checkpoint(self,file_name,restore_random)
+
+    def fork(self,count,seeds=None):
+        """
+        returns count copies of the model that continue from its current state (see checkpoint.fork_model),
+        seeds gives a seed for the variate pool of each copy
+        """
+        return checkpoint.fork_model(self,count,seeds)
+
     def step(self):
+        profiler=self.profiler
+        if profiler is not None:
+            t=profiler.clock()
+        engine=self.get_array_engine()
+        calendar=self.get_calendar()
                   
         #running covid tests on a pre-specified time intervals
         if "test" in self.interventions:
             interval=self.interventions["test"][0]
             accuracy=self.interventions["test"][1] / 100
             duration=self.interventions["test"][2]
-            if self.now.time() == self.start_time.time() and (self.now.date() - self.start_time.date()).days % interval == 0:
+            if self.tick%DAY_SECONDS == self._day_start and self.day % interval == 0:
+                if engine is not None:
+                    engine.sync_to_agents()
                 self.__Test_Intervention(accuracy, duration)
+                if engine is not None:
+                    engine.sync_from_agents()
+                calendar.check_all()
+                if profiler is not None:
+                    t=profiler.add("test",t)
 
         
         #work calendar arrangement
-        now_timedelta=datetime.timedelta(hours=self.now.time().hour,minutes=self.now.time().minute).seconds
-        if self.site_workhours[1].seconds+self.time_step>now_timedelta >= self.site_workhours[1].seconds:
-            self.now += datetime.timedelta (days=1, hours=-1* self.workhours_per_day, seconds=-1*self.time_step)
+        if calendar.is_site_closing(self.tick):
+            self.tick += self._closing_jump
+        if profiler is not None:
+            t=profiler.add("calendar",t)
 
         #at the start of each day
-        if self.now.time() == self.start_time.time() and self.now.date()!=self.start_time.date(): #sets the total volume of viruses back to zero at the start of each day
-            self.daily_infection_report[self.now.date()]=0
+        if self.tick%DAY_SECONDS == self._day_start and self.tick>=DAY_SECONDS: #sets the total volume of viruses back to zero at the start of each day
+            self.start_report_day(self.day)
+            if engine is not None:
+                engine.sync_to_agents()
             for a in self.agents:
                 if a.healthy:
                     a.check_infection() # check if a has been infected when outside work
@@ -202,10 +434,12 @@ class CovidModel(model):
                     a.check_finish_isolation()
                 elif not a.healthy and not a.symptotic:
                     a.check_symptom_start()
-            while self.now.weekday() >= self.workdays: # note: I changed if to while here
-                self.now += datetime.timedelta(days=1)
-                self.daily_infection_report[self.now.date()]=0
-            self.quanta_matrix = np.zeros([int(self.site_width), int(self.site_height),4],dtype=np.float64)
+            while calendar.weekday(self.tick) >= self.workdays: # note: I changed if to while here
+                self.tick += DAY_SECONDS
+                self.start_report_day(self.day)
+            self.quanta_matrix = np.zeros(self.quanta_matrix.shape,dtype=self.field_dtype)
+            self._quanta_zero=True
+            self._active_region=None
             
             
             
@@ -215,39 +449,81 @@ class CovidModel(model):
             if ' ' in self.interventions:
                 for a in self.agents:
                     if not a.healthy and a.symptotic and a.task_type!=4 and a.isolation_finished==False:
-                        duration=int(self.interventions['isolation'].rvs())
-                        print("Agent took", duration, "days off due to symptom development at time: ",self.now)
+                        duration=int(self.interventions['isolation'].rvs(random_state=self.variates.generator("interventions")))
+                        self.events.add(self.tick,a.number,event_log.SYMPTOM_ISOLATION,a.node)
                         a.isolate(duration)
                         a.check_finish_isolation()
+            if engine is not None:
+                engine.sync_from_agents()
+            calendar.check_all()
+            if profiler is not None:
+                t=profiler.add("start_of_day",t)
   
-        else:
-            self.Decay()
-            self.quanta_spread()
-            self.total_quanta+=(self.quanta_matrix[:,:,0]+self.quanta_matrix[:,:,1]+self.quanta_matrix[:,:,2]+self.quanta_matrix[:,:,3])
-
-        for gathering in self.gatherings:
-            if not gathering["happened"] and gathering["start"]<=self.now.time():
+        elif not self._quanta_zero:
+            self.advance_quanta()
+            if not self._quanta_emitted:
+                self.clear_quanta_below_cutoff()
+            if profiler is not None:
+                t=profiler.add("decay_spread",t)
+        self._quanta_emitted=False
+
+        for gathering,start in zip(self.gatherings,self._gathering_starts):
+            if not gathering["happened"] and start<=self.tick%DAY_SECONDS:
                 gathering["happened"]=True
-                active_agents=self.get_active_agents()
-                gathering_agents=random.sample(active_agents,min(gathering["size"],len(active_agents)))
                 gathering_duration=gathering["duration"]
-                for a in gathering_agents:
-                    a.go_to_gathering(gathering["location"],gathering_duration)
-        for a in self.agents:
-            # modeling half day working in south Korea, 4 hours is only for the case sutdy
-            # this should change for different locations and situations
-            # Future: add this option to the agent based model
-            now_timedelta=datetime.timedelta(hours=self.now.time().hour,minutes=self.now.time().minute,seconds=self.now.time().second)
-            if (self.now.weekday()<self.workdays and a.shift[0]<=now_timedelta<a.shift[0]+a.shift[1]) or (self.now.weekday()==self.workdays and a.shift[0]<=now_timedelta<a.shift[0]+datetime.timedelta(hours=5)) and a.task_type!=4:
+                stream=self.variates.stream("gathering")
+                if engine is not None:
+                    for r in range(self.replicates or 1): #each replicate has its own gathering
+                        active=engine.active if self.replicates is None else engine.active&(engine.replicate==r)
+                        active_agents=list(np.flatnonzero(active))
+                        gathering_agents=stream.sample(active_agents,min(gathering["size"],len(active_agents)))
+                        for i in gathering_agents:
+                            engine.go_to_gathering(i,random_location_selector(gathering["location"],stream),gathering_duration)
+                else:
+                    active_agents=self.get_active_agents()
+                    gathering_agents=stream.sample(active_agents,min(gathering["size"],len(active_agents)))
+                    for a in gathering_agents:
+                        a.go_to_gathering(gathering["location"],gathering_duration)
+                if profiler is not None:
+                    t=profiler.add("gatherings",t)
+        if engine is not None:
+            engine.update_shifts(self.tick)
+            if profiler is not None:
+                t=profiler.add("arrive_leave",t)
+            engine.step(self.tick)
+            self.tick += self.time_step
+            if profiler is not None:
+                profiler.add("agent_step",t)
+            return
+        # modeling half day working in south Korea, 4 hours is only for the case sutdy
+        # this should change for different locations and situations
+        # Future: add this option to the agent based model
+        #only the agents whose shift starts or ends are checked (see WorkCalendar.due)
+        idx,in_shift=calendar.due(self.tick)
+        half_day=calendar.is_half_day(self.tick)
+        recheck=[]
+        for k,s in zip(idx,in_shift):
+            a=self.agents[k]
+            if s and (not half_day or a.task_type!=4):
                 if not a.active:
                     a.arrive()
+                elif a.is_leaving:
+                    recheck.append(k) #arrives when it has left
             else:
                 if a.active and not a.is_leaving:
                     a.leave()
-        super().step() 
-            #runs step for all active agents 
-            #and increases the simulation time
-            #according to the time step
+        calendar.recheck(recheck)
+        if profiler is not None:
+            t=profiler.add("arrive_leave",t)
+        #runs step for all active agents 
+        #and increases the simulation time
+        #according to the time step
+        for a in self.agents:
+            if a.active:
+                a.step()
+        self.tick += self.time_step
+        if profiler is not None:
+            profiler.add("agent_step",t)
 
 
     def Decay(self):   
@@ -262,37 +538,67 @@ class CovidModel(model):
     def __Test_Intervention (self, accuracy, duration):
         for agent in self.agents:
             if agent.task_type!=4:
-                temp = agent.task
+                temp = agent.task_type
                 agent.task_type = 5
-                if not agent.healthy and Random_Decider(accuracy):
-                    print("Agent is taking",duration,"days off due to testing intervention at time: ",self.now)
+                if not agent.healthy and Random_Decider(accuracy,stream=self.variates.stream("test")):
+                    self.events.add(self.tick,agent.number,event_log.TEST_ISOLATION,agent.node)
                     agent.isolate(duration)
                 else:
                     agent.task_type = temp
-        self.now += datetime.timedelta(minutes=duration)
+        self.tick += duration*60
 
 
     def get_active_agents(self):
+        if self.array_engine is not None:
+            return self.array_engine.get_active_agents()
         r=[]
         for a in self.agents:
             if a.active:
                 r.append(a)
         return r
 
-    def myrun(self, end_date,interventions=None):
+    def myrun(self, end_date,interventions=None,skip_idle=True):
+        """
+        runs the model until end_date
+        skip_idle:
+            jump over the time steps in which no agent is in the building (see skip_idle_steps)
+        """
         import time
         start_run=time.time()
+        start_date=self.now
+        profiler=self.profiler
+        if profiler is not None:
+            profiler.start_run(self.paths)
         if interventions!=None:
             self.interventions=interventions
             if "mask" in self.interventions:
-                self.mask_efficiency = self.interventions["mask"][0].rvs() / 100
+                self.mask_efficiency = self.interventions["mask"][0].rvs(random_state=self.variates.generator("interventions")) / 100
                 self.mask_compliance = self.interventions["mask"][1] / 100
+        if profiler is not None:
+            t=profiler.clock()
+        self.paths.precompute()
+        if profiler is not None:
+            profiler.add("path_precompute",t)
+        end=self.time_to_tick(end_date)
+        self.get_calendar().check_all() #the agents may have changed since the last run
         self.step()
          
-        while self.now<end_date:
+        while self.tick<end:
+            if skip_idle:
+                if profiler is not None:
+                    t=profiler.clock()
+                if self.skip_idle_steps(end)>0 and profiler is not None:
+                    profiler.add("idle_skip",t)
+                if self.tick>=end:
+                    break
             self.step()
+        if self.array_engine is not None:
+            self.array_engine.sync_to_agents()
+        self.paths.save()
 
         print("end run:",time.time()-start_run)
+        if profiler is not None:
+            print(format_report(profiler.end_run(start=start_date,end=self.now,engine=self.engine,agents=len(self.agents))))
 
     def Run(self, duration, outputs, live = False):
         """
@@ -333,6 +639,178 @@ class CovidModel(model):
             print("Simulation run is completed")
             return results
 
+    def advance_quanta(self):
+        """
+        Decays and spreads the quanta of all channels and adds them to the total quanta;
+        this gives the same values as Decay(), quanta_spread() and the sum of the channels,
+        but works on all channels at once and reuses preallocated buffers.
+        Only the active region grown by one cell is updated: the quanta spread by one cell in
+        each step and the cells out of it are zero, so the borders of the grown region are
+        handled as the borders of the layout
+        """
+        if self._active_region is None:
+            return
+        w,h=self.site_width,self.site_height
+        R0,R1,C0,C1=self._active_region
+        R0,R1,C0,C1=max(R0-1,0),min(R1+1,w),max(C0-1,0),min(C1+1,h)
+        self._active_region=[R0,R1,C0,C1]
+        c=C1-C0
+        q=self.quanta_matrix.reshape(w,h,-1)
+        q[R0:R1,C0:C1]*=self._channel_decay
+        left_spread,right_spread,up_spread,down_spread=self._channel_spread
+        source,left,right,up,down,total=self._spread_buffers
+        previous_row=self._previous_row[:c]
+        for r0 in range(R0,R1,self._spread_block_rows):
+            #the block of rows r0:r1 needs the decayed quanta of rows r0-1:r1+1 before spreading
+            r1=min(r0+self._spread_block_rows,R1)
+            a0=max(r0-1,R0)
+            a1=min(r1+1,R1)
+            n=a1-a0
+            o=r0-a0
+            m=r1-r0
+            src=source[:n,:c]
+            src[:]=q[a0:a1,C0:C1]
+            if r0>R0:
+                src[0]=previous_row
+            l=left[:n,:c]
+            r=right[:n,:c]
+            u=up[:n,:c]
+            d=down[:n,:c]
+            np.multiply(left_spread[a0:a1,C0:C1],src,out=l)
+            np.multiply(right_spread[a0:a1,C0:C1],src,out=r)
+            np.multiply(up_spread[a0:a1,C0:C1],src,out=u)
+            np.multiply(down_spread[a0:a1,C0:C1],src,out=d)
+
+            #spread from the neighbour cells, i.e. the rolled matrices with zeros at the borders
+            t=total[:m,:c]
+            if r1<R1:
+                t[:]=l[o+1:o+1+m]
+            else:
+                t[:m-1]=l[o+1:o+m]
+                t[m-1]=0
+            if r0>R0:
+                t+=r[o-1:o-1+m]
+            else:
+                t[1:]+=r[:m-1]
+            t[:,1:]+=u[o:o+m,:-1]
+            t[:,:-1]+=d[o:o+m,1:]
+            #spread to the neighbour cells
+            t-=r[o:o+m]
+            t-=l[o:o+m]
+            t-=u[o:o+m]
+            t-=d[o:o+m]
+            previous_row[:]=src[o+m-1]
+            q[r0:r1,C0:C1]+=t
+        np.sum(self.quanta_matrix[R0:R1,C0:C1],axis=2,out=self._channel_sum[R0:R1,C0:C1])
+        if self._compensation is None:
+            self.total_quanta[R0:R1,C0:C1]+=self._channel_sum[R0:R1,C0:C1]
+        else:
+            exposure.compensated_add(self.total_quanta,self._compensation["total_quanta"],(slice(R0,R1),slice(C0,C1)),self._channel_sum[R0:R1,C0:C1])
+        if self.region_cutoff>0:
+            self._region_steps+=1
+            if self._region_steps>=REGION_TRIM_STEPS:
+                self.trim_active_region()
+
+    def add_to_active_region(self,rows,columns):
+        """
+        grows the active region to the cells at the given rows and columns (e.g. where quanta are emitted)
+        """
+        r0,r1,c0,c1=int(np.min(rows)),int(np.max(rows))+1,int(np.min(columns)),int(np.max(columns))+1
+        region=self._active_region
+        if region is None:
+            self._active_region=[r0,r1,c0,c1]
+        elif r0<region[0] or r1>region[1] or c0<region[2] or c1>region[3]:
+            self._active_region=[min(r0,region[0]),max(r1,region[1]),min(c0,region[2]),max(c1,region[3])]
+
+    def find_active_region(self):
+        """
+        sets the active region to the bounding box of the cells that hold quanta (e.g. after the quanta matrix is restored)
+        """
+        held=self.quanta_matrix.reshape(self.site_width,self.site_height,-1).any(axis=2)
+        rows=np.flatnonzero(held.any(axis=1))
+        columns=np.flatnonzero(held.any(axis=0))
+        self._active_region=None if len(rows)==0 else [int(rows[0]),int(rows[-1])+1,int(columns[0]),int(columns[-1])+1]
+
+    def trim_active_region(self):
+        """
+        shrinks the active region to the bounding box of the cells whose concentration in a channel is
+        at least region_cutoff, the quanta out of it are set to zero
+        """
+        self._region_steps=0
+        if self._active_region is None:
+            return
+        R0,R1,C0,C1=self._active_region
+        q=self.quanta_matrix
+        held=(q[R0:R1,C0:C1]>=self.region_cutoff).reshape(R1-R0,C1-C0,-1).any(axis=2)
+        rows=np.flatnonzero(held.any(axis=1))
+        if len(rows)==0:
+            q[R0:R1,C0:C1]=0
+            self._active_region=None
+            return
+        columns=np.flatnonzero(held.any(axis=0))
+        r0,r1,c0,c1=R0+rows[0],R0+rows[-1]+1,C0+columns[0],C0+columns[-1]+1
+        q[R0:r0,C0:C1]=0
+        q[r1:R1,C0:C1]=0
+        q[r0:r1,C0:c0]=0
+        q[r0:r1,c1:C1]=0
+        self._active_region=[int(r0),int(r1),int(c0),int(c1)]
+
+    def clear_quanta_below_cutoff(self):
+        """
+        sets the quanta matrix to zero if the concentration of all cells is below the cutoff,
+        then the decay and spread are skipped until an infected agent emits quanta again
+        """
+        if self._active_region is None:
+            self._quanta_zero=True
+            return
+        R0,R1,C0,C1=self._active_region
+        active=self.quanta_matrix[R0:R1,C0:C1]
+        if self.quanta_cutoff>0 and active.max()<self.quanta_cutoff:
+            active.fill(0)
+        if not active.any():
+            self._quanta_zero=True
+            self._active_region=None
+
+    def fast_forward_quanta(self,num_steps):
+        """
+        advances the quanta matrix num_steps time steps while no agent emits or inhales quanta
+        and adds the quanta of these steps to the total quanta; the remaining steps are skipped
+        as soon as the quanta matrix is zero or below quanta_cutoff
+        """
+        for i in range(num_steps):
+            if self._quanta_zero:
+                break
+            self.advance_quanta()
+            if not self._quanta_emitted:
+                self.clear_quanta_below_cutoff()
+            self._quanta_emitted=False
+        self._quanta_emitted=False
+
+    def skip_idle_steps(self,end):
+        """
+        jumps over the time steps in which no agent is in the building, until the next
+        arrival, the end of the working hours of the site, the start of the next day or the tick end;
+        only the quanta matrix is advanced in these steps and the gatherings starting in them
+        are marked as happened (with no agents), as they would be by running step
+        returns the number of skipped steps
+        """
+        if self.array_engine is not None and self.array_engine.n==len(self.agents):
+            if self.array_engine.active.any():
+                return 0
+        elif any(a.active for a in self.agents):
+            return 0
+        num_steps=self.get_calendar().steps_to_next_event(self.tick)
+        num_steps=min(num_steps,math.ceil((end-self.tick)/self.time_step))
+        if num_steps<=0:
+            return 0
+        last_step=(self.tick+self.time_step*(num_steps-1))%DAY_SECONDS
+        for gathering,start in zip(self.gatherings,self._gathering_starts):
+            if not gathering["happened"] and start<=last_step:
+                gathering["happened"]=True
+        self.fast_forward_quanta(num_steps)
+        self.tick+=self.time_step*num_steps
+        return num_steps
+
     def quanta_spread(self):
 
         for ch in range(4):#for each channel
@@ -355,16 +833,84 @@ class CovidModel(model):
 
             total_spread=left_spread_roll+right_spread_roll+up_spread_roll+down_spread_roll-right_quanta_spread-left_quanta_spread-up_quanta_spread-down_quanta_spread
             self.quanta_matrix[:,:,ch]+=total_spread
+        self._active_region=[0,self.site_width,0,self.site_height]
     
-    def attack_rate(self):
+    def _report_column(self,day):
+        """
+        returns the column of a day ordinal in daily_infections, the arrays are extended to hold it
+        """
+        column=day-self.first_report_day
+        days=self.daily_infections.shape[1]
+        if column<0 or column>=days:
+            before=max(0,-column)
+            after=max(column+1-days,days) if column>=days else 0 #doubles the days
+            self.daily_infections=np.pad(self.daily_infections,((0,0),(before,after)))
+            self._reported_days=np.pad(self._reported_days,((0,0),(before,after)))
+            self.first_report_day-=before
+            column+=before
+        return column
+
+    def start_report_day(self,day):
+        """
+        adds the day ordinal to the daily reports of all replicates with no infections
+        """
+        column=self._report_column(day)
+        self.daily_infections[:,column]=0
+        self._reported_days[:,column]=True
+
+    def report_infection(self,replicate,day,add=True):
+        """
+        counts an infection of the replicate in the day ordinal day; add=False sets the number of
+        infections of the day to one, as the daily reports always did for the infections dated before now
+        """
+        column=self._report_column(day)
+        if add:
+            self.daily_infections[replicate,column]+=1
+        else:
+            self.daily_infections[replicate,column]=1
+        self._reported_days[replicate,column]=True
+
+    def infection_report(self,replicate=0):
+        """
+        returns the daily infection report of the replicate, a dictionary {date: number of new infections}
+        of the reported days sorted by date
+        """
+        start=self._midnight.date()
+        counts=self.daily_infections[replicate]
+        return {start+datetime.timedelta(days=int(self.first_report_day+c)):int(counts[c]) for c in np.flatnonzero(self._reported_days[replicate])}
+
+    def set_infection_report(self,replicate,report):
+        """
+        replaces the daily infections of the replicate by a report returned by infection_report
+        """
+        self.daily_infections[replicate]=0
+        self._reported_days[replicate]=False
+        for date,number in report.items():
+            column=self._report_column((date-self._midnight.date()).days)
+            self.daily_infections[replicate,column]=number
+            self._reported_days[replicate,column]=True
+
+    @property
+    def daily_infection_report(self):
+        return self.infection_report(0)
+
+    @property
+    def daily_infection_reports(self):
+        """
+        the daily infection report of each replicate, the first one is daily_infection_report
+        """
+        return [self.infection_report(r) for r in range(self.replicates or 1)]
+
+    def attack_rate(self,replicate=0):
         results={}
         total_ill=0
         dates=[]
         numbers=[]
-        for d in self.daily_infection_report:
+        report=self.daily_infection_reports[replicate]
+        for d in report:
             dates.append(d)
-            numbers.append(self.daily_infection_report[d])
-        attack_rate=sum(numbers)/len(self.agents)*100
+            numbers.append(report[d])
+        attack_rate=sum(numbers)/(len(self.agents)/(self.replicates or 1))*100
         return attack_rate,dates,numbers
 
     def plot_daily_infections(self,file_name=None):
@@ -552,43 +1098,80 @@ class CovidAgent(agent):
             from a person in this simuation.
         '''
     
+        self.replicate=0 #replicate of the agent when the model runs several replicates
         #health status
         self.healthy=True
         self.symptotic=False
         self.color='g'
         self.inhaled=0
         self.shift = shift
+        self._shift_end = (shift[0]+shift[1]).total_seconds() #in seconds of the day
         
         # decide by chance if the person is vaccinated and provides an immunity percentage
-        self.immunity = (Random_Decider(vaccination[1] / 100) * vaccination[0].rvs() / 100) 
+        population=model.variates
+        self.immunity = (Random_Decider(vaccination[1] / 100,stream=population.stream("population")) *\
+            vaccination[0].rvs(random_state=population.generator("population")) / 100) 
         if self.immunity>0:
             self.vaccinated=True
         else:
             self.vaccinated=False
-        self.infection_time = []
+        self.infection_ticks = [] #the times are kept as ticks of the model, see infection_time
         self.infection_dates = []
-        self.symptom_start_date = None
+        self.symptom_start_tick = None
+        self._emission = None #emission profile of the current day of infection, see emission_profile
 
+        self.model = model
         self.tasks = tasks
         self.arrive()
         super().__init__(model,id,self.node,color=self.color,speed=speed)
+        self.number=len(model.agents)-1 #position of the agent in model.agents, identifies it in the event log
+        self.stream_key=self.number #identifies the random streams of the agent with common random numbers
       
         #isolation
-        self.isolation_time = [] #storing the starting time of self isolation
+        self.isolation_ticks = [] #storing the starting time of self isolation
         self.isolation_dur=0
         self.isolation_finished=False
-        self.agent_paths={} #find paths from to
         self.is_leaving=False
         self.gathering_remaining_duration=0
 
 
+    @property
+    def infection_time(self):
+        """
+        the times of the infections of the agent as datetimes
+        """
+        return [self.model.tick_to_time(t) for t in self.infection_ticks]
+
+    @infection_time.setter
+    def infection_time(self,times):
+        self.infection_ticks=[round(self.model.time_to_tick(t)) for t in times]
+
+    @property
+    def isolation_time(self):
+        """
+        the starting times of the isolations of the agent as datetimes
+        """
+        return [self.model.tick_to_time(t) for t in self.isolation_ticks]
+
+    @isolation_time.setter
+    def isolation_time(self,times):
+        self.isolation_ticks=[round(self.model.time_to_tick(t)) for t in times]
+
+    @property
+    def symptom_start_date(self):
+        return None if self.symptom_start_tick is None else self.model.tick_to_time(self.symptom_start_tick)
+
+    @symptom_start_date.setter
+    def symptom_start_date(self,time):
+        self.symptom_start_tick=None if time is None else self.model.time_to_tick(time)
+
     def arrive(self):
         tasks=self.tasks
         self.is_leaving=False
         self.active=True
         self.pos=self.tasks[0][0]
         self.stay_dur=tasks[0][1]
-        self.node=str(self.pos).strip("()")  #str:i,j
+        self.node=self.model.node_id(self.pos)
         self.task_type = 2
         self.face=1# 1:breathing, 2:normal talking, 3.loud talking or singing,4.sneezing 
         
@@ -601,23 +1184,15 @@ class CovidAgent(agent):
         self.is_leaving=True
         self.task_type=1
         t=self.tasks[0]
-        destination=str(t[0]).strip('()')
-        if (str((self.node,destination)) in self.agent_paths):
-            p=self.agent_paths[str((self.node,destination))]
-        else:
-            p=list(nx.dijkstra_path(self.model.graph,self.node,destination))
-            self.agent_paths[str((self.node,destination))]=p
+        destination=self.model.node_id(t[0])
+        p=self.model.paths.path(self.node,destination)
         self.set_path(p)
         
     def go_to_gathering(self,location,duration):
         self.task_type=1
-        destination=str(random_location_selector(location)).strip('()')
+        destination=self.model.node_id(random_location_selector(location,self.model.variates.stream("gathering")))
         self.gathering_remaining_duration=duration
-        if (str((self.node,destination)) in self.agent_paths):
-            p=self.agent_paths[str((self.node,destination))]
-        else:
-            p=list(nx.dijkstra_path(self.model.graph,self.node,destination))
-            self.agent_paths[str((self.node,destination))]=p
+        p=self.model.paths.path(self.node,destination)
         self.set_path(p)
 
     def step(self):
@@ -639,21 +1214,38 @@ class CovidAgent(agent):
                     else:
                         self.walk()
     
+                profiler=self.model.profiler
+                if profiler is not None:
+                    t=profiler.clock()
                 if not self.healthy:
                     self.emit_quanta()
+                    if profiler is not None:
+                        profiler.add("emit_quanta",t)
                 else:
-                    if not self.healthy:
-                        print("I should not be here1")
                     self.inhaling()
+                    if profiler is not None:
+                        profiler.add("inhaling",t)
             
             #getting infected when outside work
-            now_timedelta=datetime.timedelta(hours=self.model.now.time().hour,minutes=self.model.now.time().minute,seconds=self.model.now.time().second)
-            if self.healthy and now_timedelta == self.shift[0]+self.shift[1]:
-                if Random_Decider(self.model.camp_infection_rate * self.immunity) and self.healthy:
-                    self.get_infected(self.now-datetime.timedelta(days=1)) #at start of each day agents get infected by the camp infection chance; if no camp the infection rate is equal to the general rate
+            if self.healthy and self.model.tick%DAY_SECONDS == self._shift_end:
+                self.check_camp_infection()
+
+    def stream(self,name):
+        """
+        returns the random stream of the agent for a purpose ("task" or "infection"); with common random
+        numbers each agent has its own streams, so its draws do not depend on the other agents
+        """
+        return self.model.variates.stream((name,self.replicate,self.stream_key))
+
+    def check_camp_infection(self):
+        """
+        Give a chance to an agent to get infected when outside work at the end of its shift
+        """
+        if Random_Decider(self.model.camp_infection_rate * self.immunity,stream=self.stream("infection")) and self.healthy:
+            self.infect_at(self.model.tick-DAY_SECONDS,add=False,source=event_log.CAMP) #at start of each day agents get infected by the camp infection chance; if no camp the infection rate is equal to the general rate
                     
     def start_new_task(self):
-        r=random.random()
+        r=self.stream("task").random()
         prob=0
         p=[]
 
@@ -661,15 +1253,10 @@ class CovidAgent(agent):
             prob+=t[2]
             if r<prob:
                 #travel to this position
-                destination=str(t[0]).strip('()')
-                if (str((self.node,destination)) in self.agent_paths):
-                    p=self.agent_paths[str((self.node,destination))]
-                    break
-                elif t[0] != self.pos:
+                destination=self.model.node_id(t[0])
+                if t[0] != self.pos:
                     try:
-                        
-                        p=list(nx.dijkstra_path(self.model.graph,self.node,destination))
-                        self.agent_paths[str((self.node,destination))]=p
+                        p=self.model.paths.path(self.node,destination)
                         break
                     except:
                         p=[]
@@ -677,7 +1264,7 @@ class CovidAgent(agent):
                 else:
                     p=[]
                     break
-        if p == []:
+        if len(p)==0:
            self.task_type=2
            self.stay_dur=self.get_stay_dur()
         else:
@@ -706,37 +1293,54 @@ class CovidAgent(agent):
         Adds quanta to the inhaled amount of virus 
         """
         #Wells–Riley equation (Riley et al., 1978)
+        if self.model._quanta_zero:
+            return
         n=sum(self.model.quanta_matrix[self.pos[0],self.pos[1]])
-        IR=self.model.IR[self.task_type].rvs()
-        mask_facor=(1 - self.model.mask_efficiency * Random_Decider(self.model.mask_compliance))
+        IR=self.model.variates.rvs(("IR",self.task_type))
+        mask_facor=(1 - self.model.mask_efficiency * Random_Decider(self.model.mask_compliance,self.model.variates,"mask"))
         inhaled_now=IR*n*mask_facor
         self.inhaled+=inhaled_now
         if inhaled_now>0:
-            self.model.total_inhaled_matrix[self.pos[0],self.pos[1]]+=inhaled_now.copy()
-            self.model.infection_matrix[self.pos[0],self.pos[1]]+=1-np.exp(-inhaled_now)
+            compensation=self.model._compensation
+            if compensation is None:
+                self.model.total_inhaled_matrix[self.pos[0],self.pos[1]]+=inhaled_now.copy()
+                self.model.infection_matrix[self.pos[0],self.pos[1]]+=1-np.exp(-inhaled_now)
+            else:
+                cell=(self.pos[0],self.pos[1])
+                exposure.compensated_add(self.model.total_inhaled_matrix,compensation["total_inhaled_matrix"],cell,inhaled_now)
+                exposure.compensated_add(self.model.infection_matrix,compensation["infection_matrix"],cell,1-np.exp(-inhaled_now))
 
     def check_infection(self):
         """
         Give a chance to an agnet to get infected or not depending on the inhaled amount of q
         """
         R=1-math.exp(-self.inhaled)
-        if self.healthy and Random_Decider(R * (1-self.immunity)):
-            self.get_infected(self.model.now-datetime.timedelta(days=1)) #since check infection is at the start of next day, the day of infection is actually the previous day
+        if self.healthy and Random_Decider(R * (1-self.immunity),stream=self.stream("infection")):
+            self.infect_at(self.model.tick-DAY_SECONDS,add=False,source=event_log.SITE) #since check infection is at the start of next day, the day of infection is actually the previous day
             
         self.inhaled=0
 
 
 
     def get_infected(self,infection_time="now"):
+        """
+        infects the agent now or at the given datetime (see infect_at)
+        """
         if infection_time=="now":
-            self.infection_time.append(self.model.now) 
-            self.model.daily_infection_report[self.infection_time[-1].date()]+=1
+            self.infect_at(self.model.tick,cell=self.node)
         else:
-            self.infection_time.append(infection_time)
-            self.model.daily_infection_report[self.infection_time[-1].date()]=1
-        print("A new agent is infected at time", self.infection_time[-1])
-        self.infection_dates.append(str(self.infection_time[-1].date()))
-        self.symptom_start_date=self.infection_time[-1]+datetime.timedelta(days=self.model.sympotom_development.rvs())
+            self.infect_at(round(self.model.time_to_tick(infection_time)),add=False,cell=self.node)
+
+    def infect_at(self,tick,add=True,source=event_log.INITIAL,cell=-1):
+        """
+        infects the agent at the given tick of the model, add is passed to report_infection;
+        the infection is logged with its source and cell (-1 when the infection is not tied to a cell)
+        """
+        self.infection_ticks.append(tick)
+        self.model.report_infection(self.replicate,int(tick//DAY_SECONDS),add)
+        self.model.events.add(tick,self.number,event_log.INFECTION,cell,source)
+        self.infection_dates.append(str(self.model.tick_to_time(tick).date()))
+        self.symptom_start_tick=tick+self.model.variates.rvs("sympotom_development")*DAY_SECONDS
         self.healthy=False
         self.color='r'
         self.isolation_finished=False
@@ -744,7 +1348,7 @@ class CovidAgent(agent):
     def check_symptom_start(self):
         if self.symptotic:
             return
-        if self.model.now>self.symptom_start_date:
+        if self.model.tick>self.symptom_start_tick:
             self.symptotic=True
 
     def isolate(self,duration):
@@ -755,17 +1359,16 @@ class CovidAgent(agent):
         self.pos=self.model.isolation_loc
         self.node=self.model.isolation_node
         self.task_type=4 #it is in isolation
-        self.isolation_time.append(self.model.now)
+        self.isolation_ticks.append(self.model.tick)
         self.isolation_dur=duration
         self.active=False
         
     
     def check_finish_isolation(self):
-        diff=self.model.now-self.isolation_time[-1]
-        if diff.days>=self.isolation_dur:
+        if self.model.tick-self.isolation_ticks[-1]>=self.isolation_dur*DAY_SECONDS:
             self.isolation_finished=True
             self.task_type=1
-            print("Agent come back to work at time: ", self.model.now)
+            self.model.events.add(self.model.tick,self.number,event_log.END_ISOLATION)
             
     def get_viral_load(self):
         '''
@@ -812,21 +1415,26 @@ class CovidAgent(agent):
         
         load=self.model.viral_load
         vaccine_f=self.model.vaccine_viral_load_factor
-        if len(self.infection_time)==0:
+        if len(self.infection_ticks)==0:
             return 0     
-        days=self.model.now-self.infection_time[-1] #calculate number of days patient infected
-        days=days.days
+        days=(self.model.tick-self.infection_ticks[-1])//DAY_SECONDS #calculate number of days patient infected
         for k in load:
             if k[0]<=days<k[1]:
                 if self.vaccinated:
-                    return load[k].rvs()*vaccine_f
+                    return self.model.variates.rvs(("viral_load",k))*vaccine_f
                 else:
-                    return load[k].rvs()
+                    return self.model.variates.rvs(("viral_load",k))
+        self.recover()
+        return 0    
+
+    def recover(self):
+        '''
+        the agent is healthy again after the infection period
+        '''
         self.healthy=True
         self.color='g'
-        self.symptom_start_date=None
+        self.symptom_start_tick=None
         self.symptotic=False
-        return 0    
 
     def update_face_status(self):
         '''
@@ -863,16 +1471,41 @@ class CovidAgent(agent):
             self.face=1
         return True
 
+    def emission_profile(self,tick,task_type,face):
+        '''
+        returns the emission of the agent in the four channels without a mask, for the emission_profile
+        "daily" of the model: the viral load and the ci factor are drawn once for each day of the
+        infection (the agent recovers when its infection is over, see get_viral_load) and the
+        inhalation rate and particle number factor once for each activity and face in that day
+        '''
+        key=(self.infection_ticks[-1],(tick-self.infection_ticks[-1])//DAY_SECONDS)
+        if self._emission is None or self._emission[0]!=key:
+            self._emission=[key,self.get_viral_load()*self.model.variates.rvs("ci"),{}]
+        profiles=self._emission[2]
+        if (task_type,face) not in profiles:
+            variates=self.model.variates
+            profiles[(task_type,face)]=self._emission[1]*variates.rvs(("IR",task_type))*\
+                self.model.N*variates.rvs(("N_factor",face))*self.model.V
+        return profiles[(task_type,face)]
+
     def emit_quanta(self):
         
-        N=self.model.N*self.model.N_factor[self.face].rvs()
-        V=self.model.V
-        IR=self.model.IR[self.task_type].rvs()
-        ci=self.model.ci.rvs()
-        mask_factor=(1 - self.model.mask_efficiency) * Random_Decider(self.model.mask_compliance)
-        a=self.get_viral_load()
-        quanta=a*ci*IR*N*V*(1-mask_factor)
+        variates=self.model.variates
+        if self.model.emission_profile=="daily":
+            mask_factor=(1 - self.model.mask_efficiency) * Random_Decider(self.model.mask_compliance,variates,"mask")
+            quanta=self.emission_profile(self.model.tick,self.task_type,self.face)*(1-mask_factor)
+        else:
+            N=self.model.N*variates.rvs(("N_factor",self.face))
+            V=self.model.V
+            IR=variates.rvs(("IR",self.task_type))
+            ci=variates.rvs("ci")
+            mask_factor=(1 - self.model.mask_efficiency) * Random_Decider(self.model.mask_compliance,variates,"mask")
+            a=self.get_viral_load()
+            quanta=a*ci*IR*N*V*(1-mask_factor)
         self.model.quanta_matrix[self.pos[0],self.pos[1]]+=quanta
+        self.model.add_to_active_region(self.pos[0],self.pos[1])
+        self.model._quanta_zero=False
+        self.model._quanta_emitted=True
 
         #1:breathing
         #2:talking
@@ -0,0 +1,452 @@
+"""
+A structure-of-arrays engine for CovidModel.step (CovidModel(..., engine="array")).
+The state of all agents is kept in numpy arrays and the stay, walk, new task and leave rules run on
+the whole population; the state machine only runs for the agents whose stay ends and the walking
+agents. This wake-up schedule only applies to this engine: with engine="agents" (the default) every
+CovidAgent runs its step in each time step. The emission and inhalation are computed in bulk (see exposure.py)
+but still in each time step for all the agents in the building, including the staying ones, as the
+quanta field changes in each step. With common random numbers (CovidModel(common_random_numbers=True))
+the engine gives the same results as engine="agents"; without them the values are drawn in another order.
+The CovidAgent objects stay the reference for the health status: the model copies the state back
+to them (sync_to_agents) before the daily processing and reads it again (sync_from_agents).
+"""
+import numpy as np
+import networkx as nx
+import exposure
+from work_calendar import DAY_SECONDS
+
+
+class ArrayEngine():
+    def __init__(self,model):
+        '''
+        creates the arrays for all the agents of the model, the engine should be created
+        after all the agents are added to the model
+        '''
+        self.model=model
+        self.agents=list(model.agents)
+        self.n=len(self.agents)
+        w,h=model.layout.shape
+        self._node_h=h #node ids of the graph of the model are i*h+j
+        n=self.n
+
+        #state of the agents
+        self.pos=np.zeros((n,2),dtype=np.int64)
+        self.node=np.zeros(n,dtype=np.int64)
+        self.task_type=np.zeros(n,dtype=np.int64)
+        self.stay_dur=np.zeros(n,dtype=np.int64) #duration of the stay when it started, see stay_durations
+        self.wake=np.full(n,-1,dtype=np.int64) #step in which the stay of an active agent ends, -1 if it is not staying
+        self.walking=np.zeros(n,dtype=bool) #active agents traveling between positions
+        self.cursor=np.zeros(n,dtype=np.float64)
+        self.speed=np.ones(n,dtype=np.float64)
+        self.face=np.ones(n,dtype=np.int64)
+        self.healthy=np.ones(n,dtype=bool)
+        self.inhaled=np.zeros(n,dtype=np.float64)
+        self.vaccinated=np.array([a.vaccinated for a in self.agents],dtype=bool)
+        self.replicate=np.array([a.replicate for a in self.agents],dtype=np.int64)
+        self._batched=model.replicates is not None
+        self.active=np.zeros(n,dtype=bool)
+        self.is_leaving=np.zeros(n,dtype=bool)
+        self.gathering_remaining=np.zeros(n,dtype=np.int64)
+        self.steps=0 #number of steps run by the engine
+
+        #paths are stored in a flat array, each agent keeps the start and the length of its path
+        self.path_start=np.zeros(n,dtype=np.int64)
+        self.path_len=np.zeros(n,dtype=np.int64)
+        self._path_nodes=np.zeros(1024,dtype=np.int64)
+        self._path_size=0
+        self._stored_paths={} #tuple of node ids -> (start, length)
+        self._routes={} #(from node id, to node id) -> (start, length), None if there is no path
+
+        #tasks of the agents; agents with fewer tasks are padded with zero probability tasks
+        num_tasks=max([len(a.tasks) for a in self.agents]+[1])
+        self.task_node=np.full((n,num_tasks),-1,dtype=np.int64)
+        self.task_dur=np.zeros((n,num_tasks),dtype=np.int64)
+        task_prob=np.zeros((n,num_tasks),dtype=np.float64)
+        for i,a in enumerate(self.agents):
+            for k,t in enumerate(a.tasks):
+                self.task_node[i,k]=self.node_id(t[0])
+                self.task_dur[i,k]=t[1]
+                task_prob[i,k]=t[2]
+        self.task_cumprob=np.cumsum(task_prob,axis=1)
+        #routes between the task positions of each agent, [agent, from task, to task] -> start of the route
+        #in the flat path array (-1 if it is not known yet, -2 if there is no path) and its length
+        self._task_route_start=np.full((n,num_tasks,num_tasks),-1,dtype=np.int64)
+        self._task_route_len=np.zeros((n,num_tasks,num_tasks),dtype=np.int64)
+
+        self.sync_from_agents()
+
+    def node_id(self,pos):
+        return int(pos[0])*self._node_h+int(pos[1])
+
+    def _store_path(self,ids):
+        '''
+        stores a path (a sequence of node ids) in the flat path array and
+        returns its start and length; identical paths are only stored once
+        '''
+        key=tuple(ids)
+        if key in self._stored_paths:
+            return self._stored_paths[key]
+        size=len(key)
+        while self._path_size+size>len(self._path_nodes):
+            self._path_nodes=np.concatenate((self._path_nodes,np.zeros_like(self._path_nodes)))
+        start=self._path_size
+        self._path_nodes[start:start+size]=key
+        self._path_size+=size
+        self._stored_paths[key]=(start,size)
+        return start,size
+
+    def _route(self,source,destination):
+        '''
+        returns the start and length of the shortest path between two nodes,
+        or None if the two nodes are not connected
+        '''
+        key=(source,destination)
+        if key not in self._routes:
+            try:
+                p=self.model.paths.path(int(source),int(destination))
+                self._routes[key]=self._store_path(p.tolist())
+            except (nx.NetworkXNoPath,nx.NodeNotFound):
+                self._routes[key]=None
+        return self._routes[key]
+
+    def _set_route(self,i,destination):
+        route=self._route(self.node[i],destination)
+        if route is None:
+            return False
+        self.path_start[i],self.path_len[i]=route
+        self.cursor[i]=0
+        return True
+
+    def _set_node(self,idx,nodes):
+        self.node[idx]=nodes
+        self.pos[idx,0],self.pos[idx,1]=np.divmod(nodes,self._node_h)
+
+    def sync_from_agents(self):
+        '''
+        reads the state of the agent objects into the arrays
+        '''
+        for i,a in enumerate(self.agents):
+            self.pos[i]=a.pos
+            self.node[i]=self.node_id(a.pos)
+            self.task_type[i]=a.task_type
+            self.stay_dur[i]=a.stay_dur if a.stay_dur is not None else 0
+            self.speed[i]=a.speed
+            self.face[i]=a.face
+            self.healthy[i]=a.healthy
+            self.inhaled[i]=a.inhaled
+            self.active[i]=a.active
+            self.is_leaving[i]=a.is_leaving
+            self.gathering_remaining[i]=a.gathering_remaining_duration
+            path=list(map(int,a._path)) if len(a._path)>0 else [int(self.node[i])]
+            self.path_start[i],self.path_len[i]=self._store_path(path)
+            self.cursor[i]=a._id_in_path
+        self.wake[:]=-1
+        staying=np.flatnonzero(self.active&(self.task_type==2))
+        self._set_stays(staying,self.stay_dur[staying])
+        self.walking=self.active&(self.task_type==1)
+
+    def sync_to_agents(self):
+        '''
+        writes the state of the arrays back to the agent objects
+        '''
+        stay_dur=self.stay_durations()
+        for i,a in enumerate(self.agents):
+            a.pos=(int(self.pos[i,0]),int(self.pos[i,1]))
+            a.node=int(self.node[i])
+            a.task_type=int(self.task_type[i])
+            a.stay_dur=int(stay_dur[i])
+            a.face=int(self.face[i])
+            a.inhaled=self.inhaled[i]
+            a.active=bool(self.active[i])
+            a.is_leaving=bool(self.is_leaving[i])
+            a.gathering_remaining_duration=int(self.gathering_remaining[i])
+            start=self.path_start[i]
+            a._path=self._path_nodes[start:start+self.path_len[i]].astype(np.int32)
+            a._id_in_path=float(self.cursor[i]) if self.cursor[i]%1 else int(self.cursor[i])
+
+    def _stay_durations(self,idx):
+        '''
+        vectorized CovidAgent.get_stay_dur: the remaining duration of a gathering if there is one,
+        otherwise the duration of the first task located at the position of the agent
+        '''
+        match=self.task_node[idx]==self.node[idx,None]
+        first=np.argmax(match,axis=1)
+        dur=np.where(match.any(axis=1),self.task_dur[idx,first],0)
+        dur=np.where(self.gathering_remaining[idx]>0,self.gathering_remaining[idx],dur)
+        self.gathering_remaining[idx]=0
+        return dur
+
+    def _set_stays(self,idx,durations):
+        '''
+        the agents start to stay in their positions for the durations, counted down from the next step
+        '''
+        self.stay_dur[idx]=durations
+        self.wake[idx]=self.steps+1+np.maximum(durations,0)
+
+    def _stop_stay(self,i):
+        # the agent leaves its position before the end of its stay, the remaining duration is kept
+        if self.wake[i]>=0 and self.stay_dur[i]>0:
+            self.stay_dur[i]=min(max(self.wake[i]-self.steps-1,0),self.stay_dur[i])
+        self.wake[i]=-1
+
+    def stay_durations(self):
+        '''
+        returns the remaining stay durations of the agents after the last step, as CovidAgent.stay_dur
+        '''
+        counting=(self.wake>=0)&(self.stay_dur>0)
+        return np.where(counting,np.minimum(np.maximum(self.wake-self.steps-1,0),self.stay_dur),self.stay_dur)
+
+    def get_active_agents(self):
+        return [self.agents[i] for i in np.flatnonzero(self.active)]
+
+    def update_shifts(self,tick):
+        '''
+        makes the agents whose shift has started arrive and the agents whose shift has finished leave
+        '''
+        calendar=self.model.get_calendar()
+        idx,in_shift=calendar.due(tick)
+        if len(idx)==0:
+            return
+        if calendar.is_half_day(tick): # half day working, see CovidModel.step
+            in_shift&=self.task_type[idx]!=4
+        active=self.active[idx]
+        self.arrive(idx[in_shift&~active])
+        for i in idx[~in_shift&active&~self.is_leaving[idx]]:
+            self.leave(i)
+        calendar.recheck(idx[in_shift&active&self.is_leaving[idx]])
+
+    def arrive(self,idx):
+        self.is_leaving[idx]=False
+        self.active[idx]=True
+        self._set_node(idx,self.task_node[idx,0])
+        self._set_stays(idx,self.task_dur[idx,0])
+        self.task_type[idx]=2
+        self.face[idx]=1
+
+    def leave(self,i):
+        self.is_leaving[i]=True
+        self.task_type[i]=1
+        self._stop_stay(i)
+        self.walking[i]=True
+        self._set_route(i,self.task_node[i,0])
+
+    def go_to_gathering(self,i,destination,duration):
+        self.task_type[i]=1
+        self._stop_stay(i)
+        self.walking[i]=True
+        self.gathering_remaining[i]=duration
+        self._set_route(i,self.node_id(destination))
+
+    def start_new_task(self,idx):
+        '''
+        vectorized CovidAgent.start_new_task: chooses the next task of each agent and
+        sets the path toward it, or keeps the agent in its place
+        '''
+        if self.model.common_random_numbers: #each agent has its own stream
+            r=np.array([self.agents[i].stream("task").random() for i in idx],dtype=np.float64)
+        else:
+            r=self.model.variates.rvs("task",len(idx))
+        chosen=r[:,None]<self.task_cumprob[idx]
+        task=np.argmax(chosen,axis=1)
+        destination=self.task_node[idx,task]
+        move=chosen.any(axis=1)&(destination!=self.node[idx])
+        movers,task,destination=idx[move],task[move],destination[move]
+        #the routes from the task position of the agent are looked up in the route table,
+        #only the routes used for the first time (or from another position) are searched one by one
+        origin=self.task_node[movers]==self.node[movers,None]
+        at_task=np.where(origin.any(axis=1),np.argmax(origin,axis=1),-1)
+        start=np.where(at_task>=0,self._task_route_start[movers,at_task,task],-1)
+        length=self._task_route_len[movers,at_task,task]
+        for k in np.flatnonzero(start==-1):
+            route=self._route(self.node[movers[k]],destination[k])
+            start[k],length[k]=(-2,0) if route is None else route
+            if at_task[k]>=0:
+                self._task_route_start[movers[k],at_task[k],task[k]]=start[k]
+                self._task_route_len[movers[k],at_task[k],task[k]]=length[k]
+        found=start>=0
+        walkers=movers[found]
+        self.path_start[walkers]=start[found]
+        self.path_len[walkers]=length[found]
+        self.cursor[walkers]=0
+        self.task_type[walkers]=1
+        self.walking[walkers]=True
+        stay=np.concatenate((idx[~move],movers[~found]))
+        self.task_type[stay]=2
+        self._set_stays(stay,self._stay_durations(stay))
+
+    def walk(self,idx):
+        cursor=np.minimum(self.cursor[idx]+self.speed[idx],self.path_len[idx]-1)
+        self.cursor[idx]=cursor
+        self._set_node(idx,self._path_nodes[self.path_start[idx]+cursor.astype(np.int64)])
+
+    def step(self,tick):
+        '''
+        runs the step of all active agents, equivalent to calling CovidAgent.step for each of them;
+        the state machine only runs for the agents whose stay ends in this step and the walking agents
+        '''
+        self.steps+=1
+        stepped=np.flatnonzero(self.active)
+        moving=stepped[self.task_type[stepped]!=4] #agents in isolation do not move
+        traveling=np.flatnonzero(self.walking)
+
+        #staying in a position, the stays that end in this step
+        done=np.flatnonzero(self.wake==self.steps)
+        if len(done)>0:
+            self.wake[done]=-1
+            self.stay_dur[done]=np.minimum(self.stay_dur[done],0)
+            leaving=self.is_leaving[done]
+            self.start_new_task(done[~leaving])
+            self.active[done[leaving]]=False
+            self.is_leaving[done[leaving]]=False
+
+        #traveling between different positions
+        if len(traveling)>0:
+            arrived=self.node[traveling]==self._path_nodes[self.path_start[traveling]+self.path_len[traveling]-1]
+            reached=traveling[arrived]
+            self.task_type[reached]=2
+            self.walking[reached]=False
+            self._set_stays(reached,self._stay_durations(reached))
+            self.walk(traveling[~arrived])
+
+        self.exposure(moving,tick)
+
+        #getting infected when outside work
+        t=tick%DAY_SECONDS
+        shift_end=self.model.get_calendar().shift_end
+        for i in stepped[self.healthy[stepped]&(shift_end[stepped]==t)]:
+            self.agents[i].check_camp_infection()
+            self.healthy[i]=self.agents[i].healthy
+
+    def _decide(self,probability,size,key="uniform"):
+        '''
+        vectorized Random_Decider
+        '''
+        if probability<=0:
+            return np.zeros(size,dtype=bool)
+        return self.model.variates.rvs(key,size)<=probability
+
+    def _draw(self,name,keys):
+        '''
+        draws one value for each agent from the distribution name[key] of its key
+        '''
+        values=np.empty(len(keys))
+        for k in np.unique(keys):
+            selected=keys==k
+            values[selected]=self.model.variates.rvs((name,int(k)),int(selected.sum()))
+        return values
+
+    def viral_loads(self,idx,tick):
+        '''
+        vectorized CovidAgent.get_viral_load, the agents whose infection period is over recover
+        '''
+        model=self.model
+        load=np.zeros(len(idx))
+        infected=np.array([len(self.agents[i].infection_ticks)>0 for i in idx],dtype=bool)
+        days=np.array([(tick-self.agents[i].infection_ticks[-1])//DAY_SECONDS if infected[k] else -1 for k,i in enumerate(idx)])
+        found=~infected
+        for key in model.viral_load:
+            selected=(key[0]<=days)&(days<key[1])&~found
+            if selected.any():
+                load[selected]=model.variates.rvs(("viral_load",key),int(selected.sum()))
+                found|=selected
+        vaccinated=self.vaccinated[idx]
+        load[vaccinated]*=model.vaccine_viral_load_factor
+        for i in idx[~found]:
+            self.agents[i].recover()
+            self.healthy[i]=True
+        return load
+
+    def emission_profiles(self,idx,tick):
+        '''
+        returns the emissions of the agents without masks from their daily emission profiles
+        (see CovidAgent.emission_profile), the agents whose infection period is over recover
+        '''
+        quanta=np.zeros((len(idx),4))
+        for k,i in enumerate(idx):
+            a=self.agents[i]
+            quanta[k]=a.emission_profile(tick,int(self.task_type[i]),int(self.face[i]))
+            self.healthy[i]=a.healthy
+        return quanta
+
+    def early_channels(self,inhalers,emitters,quanta):
+        '''
+        returns the inhalers that share their cell with a later emitter (as a boolean array, None if there
+        are none) and the concentrations they inhale: the agents engine runs the agents one after another,
+        so they only see the quanta emitted in their cell by the emitters before them;
+        it is called before the quanta of the emitters are added to the quanta matrix
+        '''
+        cells=self.node[inhalers]
+        emitter_cells=self.node[emitters]
+        if self._batched:
+            cells=cells+self.replicate[inhalers]*self.model.layout.size
+            emitter_cells=emitter_cells+self.replicate[emitters]*self.model.layout.size
+        early=np.isin(cells,emitter_cells)
+        for k in np.flatnonzero(early):
+            early[k]=(emitters[emitter_cells==cells[k]]>inhalers[k]).any()
+        if not early.any():
+            return None,None
+        e=inhalers[early]
+        channels=exposure.concentrations(self.model.quanta_matrix,self.pos[e,0],self.pos[e,1],\
+            self.replicate[e] if self._batched else None).copy()
+        for k,(i,cell) in enumerate(zip(e,cells[early])):
+            for j in np.flatnonzero((emitter_cells==cell)&(emitters<i)):
+                channels[k]+=quanta[j]
+        return early,channels
+
+    def exposure(self,idx,tick):
+        '''
+        infected agents emit quanta and healthy agents inhale quanta at their positions;
+        the emissions of all agents are added to the quanta matrix before the inhalation, except
+        for the agents that share their cell with a later emitter (see early_channels)
+        '''
+        model=self.model
+        variates=model.variates
+        profiler=model.profiler
+        infected=~self.healthy[idx]
+        if model._quanta_zero:
+            if not infected.any():
+                return #nothing to emit or inhale
+            #as in CovidAgent.inhaling, the agents before the first emitter do not draw while the quanta matrix is zero
+            first=int(np.argmax(infected))
+            idx,infected=idx[first:],infected[first:]
+        if profiler is not None:
+            t=profiler.clock()
+        IR=self._draw("IR",self.task_type[idx])
+        mask=self._decide(model.mask_compliance,len(idx),"mask")
+
+        emitters=idx[infected]
+        inhalers=idx[~infected]
+        early=None
+        if len(emitters)>0:
+            if model.emission_profile=="daily":
+                mask_factor=(1-model.mask_efficiency)*mask[infected]
+                quanta=self.emission_profiles(emitters,tick)*(1-mask_factor)[:,None]
+            else:
+                N=model.N[None,:]*self._draw("N_factor",self.face[emitters])[:,None]
+                ci=variates.rvs("ci",len(emitters))
+                mask_factor=(1-model.mask_efficiency)*mask[infected]
+                a=self.viral_loads(emitters,tick)
+                quanta=(a*ci*IR[infected])[:,None]*N*model.V*(1-mask_factor)[:,None]
+            early,channels=self.early_channels(inhalers,emitters,quanta)
+            exposure.emit(model.quanta_matrix,self.pos[emitters,0],self.pos[emitters,1],quanta,\
+                self.replicate[emitters] if self._batched else None)
+            model.add_to_active_region(self.pos[emitters,0],self.pos[emitters,1])
+            model._quanta_zero=False
+            model._quanta_emitted=True
+        if profiler is not None:
+            t=profiler.add("emit_quanta",t)
+
+        IR=IR[~infected]
+        mask_factor=1-model.mask_efficiency*mask[~infected]
+        if early is not None:
+            #the agents before a later emitter of their cell inhale first, the doses of a cell are added in the order of the agents
+            e=inhalers[early]
+            self.inhaled[e]+=exposure.inhale(model.quanta_matrix,model.total_inhaled_matrix,model.infection_matrix,\
+                self.pos[e,0],self.pos[e,1],IR[early],mask_factor[early],\
+                self.replicate[e] if self._batched else None,model._compensation,channels)
+            inhalers,IR,mask_factor=inhalers[~early],IR[~early],mask_factor[~early]
+        self.inhaled[inhalers]+=exposure.inhale(model.quanta_matrix,model.total_inhaled_matrix,model.infection_matrix,\
+            self.pos[inhalers,0],self.pos[inhalers,1],IR,mask_factor,\
+            self.replicate[inhalers] if self._batched else None,model._compensation)
+        if profiler is not None:
+            profiler.add("inhaling",t)
@@ -0,0 +1,267 @@
+"""
+Benchmark suite of the CoDiSS model on synthetic offices.
+The offices are grids of square rooms with doors in the walls, some of them amenity rooms (elevator,
+coffee, washroom, meeting cells) and the others filled with desks; the agents get the tasks and
+shifts of case_study_MCS.py. Each case (size, agents, engine) runs in its own process and its build
+time, path table warmup, steps per second, time per simulated day, phase times and peak memory are
+appended as a line of JSON to the output file, with the date, the git commit and the versions:
+
+    python benchmark.py                          #quick suite
+    python benchmark.py --suite full             #up to 2048x2048 cells and 10,000 agents
+    python benchmark.py --cases 128x1000 256x3000 --engines array --days 2
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from queue import Empty
+import numpy as np
+import scipy.stats as st
+
+#(cells per side, number of agents) of the cases of each suite
+SUITES={"quick":[(32,100),(64,300),(128,1000)],
+          "full":[(32,100),(64,300),(128,1000),(256,3000),(512,10000),(1024,10000),(2048,10000)]}
+START=datetime.datetime(2020,2,24,8,0) #a Monday
+
+
+def synthetic_layout(width,height,room=10,door=2):
+    '''
+    returns a layout of width x height cells divided into square rooms of room cells per side,
+    each wall has a door of door cells in its middle (see ABS.model for the values of the cells)
+    '''
+    layout=np.zeros((width,height))
+    rows=np.arange(room-1,width-1,room)
+    cols=np.arange(room-1,height-1,room)
+    layout[rows,:]=2
+    layout[:,cols]=1
+    layout[np.ix_(rows,cols)]=3
+    mid=room//2
+    layout[np.ix_(rows,np.flatnonzero((np.arange(height)%room>=mid)&(np.arange(height)%room<mid+door)))]=0
+    layout[np.ix_(np.flatnonzero((np.arange(width)%room>=mid)&(np.arange(width)%room<mid+door)),cols)]=0
+    return layout
+
+
+def synthetic_locations(width,height,room=10,amenity_every=3):
+    '''
+    returns the locations of a synthetic layout: the rooms whose two indices are multiples of
+    amenity_every (plus one) are amenity rooms, the other rooms are office rooms with a desk on every
+    other cell; the amenity room of each office room is the nearest one
+    "desk": (i, j) arrays of the desks, "room": room number of each desk,
+    "elevator", "coffee", "washroom": (i, j) arrays with the cell of each amenity room,
+    "meet": [i array, j array] of the meeting cells of the first amenity room,
+    "amenity": index of the amenity room of each desk
+    '''
+    rooms_i=(width+room-1)//room
+    rooms_j=(height+room-1)//room
+    first_i,first_j=min(1,rooms_i-1),min(1,rooms_j-1) #the first amenity room is the second room
+    amenities=[(ri,rj) for ri in range(rooms_i) for rj in range(rooms_j)
+                 if ri%amenity_every==first_i and rj%amenity_every==first_j]
+    centers=np.array([(ri*room,rj*room) for ri,rj in amenities])
+    desk_i,desk_j,desk_room=[],[],[]
+    offsets=range(1,room-2,2)
+    for ri in range(rooms_i):
+        for rj in range(rooms_j):
+            if (ri,rj) in amenities:
+                continue
+            for di in offsets:
+                for dj in offsets:
+                    i,j=ri*room+di,rj*room+dj
+                    if i<width-1 and j<height-1:
+                        desk_i.append(i)
+                        desk_j.append(j)
+                        desk_room.append(ri*rooms_j+rj)
+    desk=np.array([desk_i,desk_j],dtype=np.int64)
+    #nearest amenity room of each desk
+    distance=np.abs(desk[0][:,None]-centers[None,:,0])+np.abs(desk[1][:,None]-centers[None,:,1])
+    amenity=np.argmin(distance,axis=1)
+
+    def cell(di,dj):
+        return np.array([[min(i+di,width-2) for i,j in centers],[min(j+dj,height-2) for i,j in centers]])
+
+    meet_i,meet_j=np.meshgrid(range(centers[0][0]+4,min(centers[0][0]+8,width-1)),
+                                 range(centers[0][1]+1,min(centers[0][1]+8,height-1)))
+    return {"desk":desk,"room":np.array(desk_room),"amenity":amenity,
+            "elevator":cell(1,1),"coffee":cell(1,4),"washroom":cell(2,7),
+            "meet":[meet_i.flatten(),meet_j.flatten()]}
+
+
+def synthetic_agents(locations,number,seed=0):
+    '''
+    returns the crews of number agents for CovidModel.add_crew, with the tasks and shifts of
+    case_study_MCS.py; the first agent is infected
+    '''
+    rng=np.random.default_rng(seed)
+    desk=locations["desk"]
+    chosen=rng.choice(desk.shape[1],number,replace=number>desk.shape[1])
+    by_room={}
+    for k,r in enumerate(locations["room"]):
+        by_room.setdefault(r,[]).append(k)
+    agents=[]
+    for n,k in enumerate(chosen):
+        a=locations["amenity"][k]
+        friend=rng.choice(by_room[locations["room"][k]])
+        task_ps=np.array([rng.uniform(86,93),rng.uniform(3,6),rng.uniform(3,6),rng.uniform(1,2)])
+        task_ps=task_ps/task_ps.sum()
+        start=datetime.timedelta(hours=8,minutes=30+int(rng.integers(0,30)))
+        agents.append({"crew size":1,"speed":60,"infected":n==0,
+                       "tasks":[[tuple(int(x) for x in locations["elevator"][:,a]),3,0],
+                                 [(int(desk[0,k]),int(desk[1,k])),5,task_ps[0]],
+                                 [tuple(int(x) for x in locations["coffee"][:,a]),5,task_ps[1]],
+                                 [(int(desk[0,friend]),int(desk[1,friend])),5,task_ps[2]],
+                                 [tuple(int(x) for x in locations["washroom"][:,a]),5,task_ps[3]]],
+                       "shift":[start,datetime.timedelta(hours=8)]})
+    return agents
+
+
+def peak_memory():
+    '''
+    returns the peak resident memory of the process in MB, None if it cannot be measured
+    '''
+    try:
+        import resource
+    except ImportError: #Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset/2**20
+        except (ImportError,AttributeError):
+            return None
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform=="darwin" else peak/1024
+
+
+def run_case(size,agents,engine="array",days=1,seed=0,path_cache=None,region_cutoff=0,field_dtype="float64"):
+    '''
+    builds and runs the model of a case and returns its measures as a dictionary
+    '''
+    import contextlib
+    import io
+    import CoDiSS
+    from paths import PathService
+    result={}
+    t=time.perf_counter()
+    layout=synthetic_layout(size,size)
+    locations=synthetic_locations(size,size)
+    crews=synthetic_agents(locations,agents,seed)
+    result["setup_time"]=time.perf_counter()-t
+    result["desks"]=int(locations["desk"].shape[1])
+
+    t=time.perf_counter()
+    model=CoDiSS.CovidModel(layout=layout,start_date=START,ventilation_efficiency=np.full(layout.shape,.3),
+                              infection_rate=[0.0,0],workhours_per_day=9.5,interventions={"isolation":st.uniform(0,3)},
+                              ghatherings=[{"location":locations["meet"],"start":datetime.time(10,0),"duration":60,"size":15}],
+                              time_step=60,workdays=5,seed=seed,engine=engine,path_cache=path_cache,profile=True,
+                              region_cutoff=region_cutoff,field_dtype=field_dtype)
+    result["build_time"]=time.perf_counter()-t #with the loading of the path cache, if it is saved
+    t=time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for crew in crews:
+            added=model.add_crew(crew)
+            if crew["infected"]:
+                added[0].get_infected(START)
+    result["agents_time"]=time.perf_counter()-t
+
+    t=time.perf_counter()
+    model.paths.precompute()
+    result["warmup_time"]=time.perf_counter()-t
+    result["path_searches"]=model.paths.searches
+    result["paths"]=len(model.paths._paths)
+    result["points_of_interest"]=len(model.paths.locations)
+    if path_cache is not None:
+        model.paths.save()
+        t=time.perf_counter()
+        PathService(model.graph,model.layout,path_cache)
+        result["cache_load_time"]=time.perf_counter()-t
+
+    end=START+datetime.timedelta(days=days)
+    with contextlib.redirect_stdout(io.StringIO()): #the model prints the time of the run and the profile
+        t=time.perf_counter()
+        model.myrun(end)
+        result["run_time"]=time.perf_counter()-t
+    report=model.profiler.reports[-1]
+    steps=report["phases"]["calendar"]["calls"]
+    result["steps"]=steps
+    result["steps_per_second"]=steps/result["run_time"]
+    result["time_per_day"]=result["run_time"]/days
+    result["phases"]={p:{"time":v["time"],"calls":v["calls"]} for p,v in report["phases"].items()}
+    result["infections"]=sum(model.daily_infection_report.values())
+    result["peak_memory_mb"]=peak_memory()
+    return result
+
+
+def _run_case(queue,case):
+    try:
+        queue.put(("ok",run_case(**case)))
+    except BaseException as ex:
+        queue.put(("error: "+repr(ex),None))
+
+
+def _commit():
+    try:
+        return subprocess.run(["git","rev-parse","--short","HEAD"],capture_output=True,text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(cases,engines=("agents","array"),days=1,output="benchmarks.jsonl",timeout=3600,path_cache=None,
+              region_cutoff=0,field_dtype="float64"):
+    '''
+    runs each (cells per side, number of agents) case with each engine in its own process and
+    appends the results to the output file, one line of JSON per case; returns the results
+    '''
+    info={"date":datetime.datetime.now().isoformat(timespec="seconds"),"commit":_commit(),
+            "python":platform.python_version(),"numpy":np.__version__,"platform":platform.platform()}
+    results=[]
+    for size,agents in cases:
+        for engine in engines:
+            case={"size":size,"agents":agents,"engine":engine,"days":days,"path_cache":path_cache,
+                    "region_cutoff":region_cutoff,"field_dtype":field_dtype}
+            queue=multiprocessing.Queue()
+            process=multiprocessing.Process(target=_run_case,args=(queue,case))
+            process.start()
+            status,measures="timeout",None
+            deadline=time.time()+timeout
+            while time.time()<deadline:
+                try:
+                    status,measures=queue.get(timeout=1)
+                    break
+                except Empty:
+                    if not process.is_alive(): #e.g. killed when the memory is exhausted
+                        status="error: the process exited with code "+str(process.exitcode)
+                        break
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+            record=dict(info,case=case,status=status,**(measures or {}))
+            results.append(record)
+            with open(output,"a") as f:
+                f.write(json.dumps(record)+"\n")
+            if measures is None:
+                print("%5dx%-5d %6d agents %-6s %s"%(size,size,agents,engine,status))
+            else:
+                print("%5dx%-5d %6d agents %-6s build %7.2fs warmup %7.2fs %8.1f steps/s %8.2fs/day %8.0f MB"
+                      %(size,size,agents,engine,measures["build_time"]+measures["agents_time"],
+                         measures["warmup_time"],measures["steps_per_second"],measures["time_per_day"],
+                         measures["peak_memory_mb"] or float("nan")))
+    return results
+
+
+if __name__=="__main__":
+    parser=argparse.ArgumentParser(description="benchmark of the CoDiSS model on synthetic offices")
+    parser.add_argument("--suite",choices=sorted(SUITES),default="quick")
+    parser.add_argument("--cases",nargs="*",help="cases as SIZExAGENTS, e.g. 256x3000 (replaces the suite)")
+    parser.add_argument("--engines",nargs="*",default=["agents","array"])
+    parser.add_argument("--days",type=int,default=1,help="number of simulated days")
+    parser.add_argument("--output",default="benchmarks.jsonl")
+    parser.add_argument("--timeout",type=float,default=3600,help="seconds allowed for each case")
+    parser.add_argument("--path-cache",default=None,help="directory of the path cache, to measure its loading")
+    parser.add_argument("--region-cutoff",type=float,default=0,help="region_cutoff of the models (see CoDiSS.CovidModel)")
+    parser.add_argument("--field-dtype",choices=["float64","float32"],default="float64",help="field_dtype of the models")
+    args=parser.parse_args()
+    cases=[tuple(int(x) for x in c.split("x")) for c in args.cases] if args.cases else SUITES[args.suite]
+    run_suite(cases,args.engines,args.days,args.output,args.timeout,args.path_cache,args.region_cutoff,args.field_dtype)
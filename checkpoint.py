@@ -0,0 +1,234 @@
+"""
+Checkpoints and forks of the CoDiSS model.
+save_checkpoint writes the state of a running CovidModel (clock, quanta matrices, reports, event log,
+agents and random generators) in a compressed .npz file with a JSON header, without pickling;
+load_checkpoint restores it into a new model built with the same settings and without agents, and
+the restored model continues the run with the same results. fork_model copies a model in memory into
+branches that share its layout, graph and path table, e.g. to run several scenarios after a common
+burn-in period.
+"""
+import copy
+import datetime
+import json
+import random
+import numpy as np
+from paths import layout_key
+from variates import _key
+
+CHECKPOINT_VERSION=1
+
+
+def _time(value):
+    return None if value is None else value.isoformat()
+
+
+def _parse_time(value):
+    return None if value is None else datetime.datetime.fromisoformat(value)
+
+
+def _flat(sequences,dtype):
+    # a list of sequences as a flat array and the offsets of the sequences
+    lengths=[len(s) for s in sequences]
+    offsets=np.concatenate(([0],np.cumsum(lengths))).astype(np.int64)
+    values=np.concatenate([np.asarray(s,dtype=dtype) for s in sequences]) if sum(lengths)>0 else np.zeros(0,dtype=dtype)
+    return values,offsets
+
+
+def _split(values,offsets):
+    return [values[offsets[k]:offsets[k+1]] for k in range(len(offsets)-1)]
+
+
+def checkpoint_name(file_name):
+    '''
+    returns the name of the checkpoint file, with the .npz extension added by numpy.savez
+    '''
+    return file_name if str(file_name).endswith(".npz") else str(file_name)+".npz"
+
+
+def save_checkpoint(model,file_name):
+    '''
+    saves the state of the model in a compressed .npz file, the extension is added to file_name
+    if it does not have it
+    '''
+    if model.array_engine is not None and model.array_engine.n==len(model.agents):
+        model.array_engine.sync_to_agents()
+    agents=model.agents
+    arrays={}
+    #model
+    arrays["quanta_matrix"]=model.quanta_matrix
+    arrays["total_quanta"]=model.total_quanta
+    arrays["total_inhaled_matrix"]=model.total_inhaled_matrix
+    arrays["infection_matrix"]=model.infection_matrix
+    for name,compensation in (model._compensation or {}).items():
+        arrays["compensation_"+name]=compensation
+    for name,values in model.events.get_state().items():
+        arrays["event_"+name]=values
+    #agents
+    arrays["pos"]=np.array([a.pos for a in agents],dtype=np.int64).reshape(-1,2)
+    for name,dtype in (("task_type",np.int64),("face",np.int64),("speed",np.float64),("inhaled",np.float64),
+                        ("immunity",np.float64),("healthy",bool),("symptotic",bool),("vaccinated",bool),
+                        ("active",bool),("is_leaving",bool),("isolation_dur",np.int64),
+                        ("isolation_finished",bool),("gathering_remaining_duration",np.int64),("replicate",np.int64)):
+        arrays[name]=np.array([getattr(a,name) for a in agents],dtype=dtype)
+    arrays["stay_dur"]=np.array([-1 if a.stay_dur is None else a.stay_dur for a in agents],dtype=np.int64)
+    arrays["id_in_path"]=np.array([a._id_in_path for a in agents],dtype=np.float64)
+    arrays["shift"]=np.array([[s.total_seconds() for s in a.shift] for a in agents],dtype=np.float64).reshape(-1,2)
+    arrays["path_nodes"],arrays["path_offsets"]=_flat([a._path for a in agents],np.int32)
+    arrays["task_positions"],arrays["task_offsets"]=_flat([[t[0] for t in a.tasks] for a in agents],np.int64)
+    arrays["task_durations"],_=_flat([[t[1] for t in a.tasks] for a in agents],np.int64)
+    arrays["task_probabilities"],_=_flat([[t[2] for t in a.tasks] for a in agents],np.float64)
+    #random generators
+    variates=model.variates.get_state()
+    for k,block in enumerate(variates["blocks"]):
+        arrays["variate_block_"+str(k)]=block
+    #the internal states of the random.Random streams (625 values each) are kept in an array, their names and the rest in json
+    arrays["stream_states"]=np.array([s[1] for _,s in variates["streams"]],dtype=np.uint32).reshape(len(variates["streams"]),625)
+    variates["streams"]=[[name,s[0],s[2]] for name,s in variates["streams"]]
+    np_state=np.random.get_state()
+    arrays["np_random_keys"]=np_state[1]
+
+    meta={"version":CHECKPOINT_VERSION,
+            "layout":layout_key(model.layout),
+            "start_time":_time(model.start_time),
+            "time_step":model.time_step,
+            "replicates":model.replicates,
+            "common_random_numbers":model.common_random_numbers,
+            "field_dtype":model.field_dtype.name,
+            "now":_time(model.now),
+            "quanta_zero":model._quanta_zero,
+            "quanta_emitted":model._quanta_emitted,
+            "mask_efficiency":model.mask_efficiency,
+            "mask_compliance":model.mask_compliance,
+            "gatherings_happened":[g["happened"] for g in model.gatherings],
+            "daily_infection_reports":[[[d.isoformat(),n] for d,n in report.items()] for report in model.daily_infection_reports],
+            "agents":[{"stream_key":a.stream_key,"marker":a.marker,"color":a.color,"size":a.size,"alpha":a.alpha,
+                        "infection_time":[_time(t) for t in a.infection_time],
+                        "infection_dates":a.infection_dates,
+                        "symptom_start_date":_time(a.symptom_start_date),
+                        "isolation_time":[_time(t) for t in a.isolation_time],
+                        "emission":None if a._emission is None else
+                            [list(a._emission[0]),a._emission[1],[[t,f,list(map(float,p))] for (t,f),p in a._emission[2].items()]]} for a in agents],
+            "variates":dict({k:v for k,v in variates.items() if k!="blocks"},
+                             keys=[repr(k) for k in variates["keys"]]),
+            "random":random.getstate(),
+            "np_random":[np_state[0]]+[v.item() if isinstance(v,np.generic) else v for v in np_state[2:]]}
+    np.savez_compressed(checkpoint_name(file_name),meta=np.array(json.dumps(meta)),**arrays)
+
+
+def load_checkpoint(model,file_name,restore_random=True):
+    '''
+    restores the state saved in a checkpoint into a model built with the same settings and without
+    agents, the agents are created from the checkpoint; file_name is given as to save_checkpoint
+    restore_random:
+        also restore the random and numpy.random global states
+    '''
+    from CoDiSS import CovidAgent
+    with np.load(checkpoint_name(file_name),allow_pickle=False) as data:
+        meta=json.loads(str(data["meta"]))
+        arrays={k:data[k] for k in data.files if k!="meta"}
+    if meta["version"]!=CHECKPOINT_VERSION:
+        raise ValueError("the checkpoint was saved by another version: "+str(meta["version"]))
+    if meta["layout"]!=layout_key(model.layout):
+        raise ValueError("the checkpoint was saved for another layout")
+    for name in ("start_time","time_step","replicates","common_random_numbers","field_dtype"):
+        value=_time(model.start_time) if name=="start_time" else getattr(model,name)
+        value=value.name if name=="field_dtype" else value
+        if meta.get(name,"float64" if name=="field_dtype" else None)!=value:
+            raise ValueError("the checkpoint was saved with another "+name+": "+str(meta[name]))
+    if len(meta["gatherings_happened"])!=len(model.gatherings):
+        raise ValueError("the checkpoint was saved with another number of gatherings")
+    if len(model.agents)>0:
+        raise ValueError("a checkpoint can only be restored into a model without agents")
+
+    #model
+    model.now=_parse_time(meta["now"])
+    model.quanta_matrix[...]=arrays["quanta_matrix"]
+    model.total_quanta[...]=arrays["total_quanta"]
+    model.total_inhaled_matrix[...]=arrays["total_inhaled_matrix"]
+    model.infection_matrix[...]=arrays["infection_matrix"]
+    for name,compensation in (model._compensation or {}).items():
+        compensation[...]=arrays["compensation_"+name]
+    model.find_active_region()
+    model._quanta_zero=meta["quanta_zero"]
+    model._quanta_emitted=meta["quanta_emitted"]
+    model.mask_efficiency=meta["mask_efficiency"]
+    model.mask_compliance=meta["mask_compliance"]
+    for gathering,happened in zip(model.gatherings,meta["gatherings_happened"]):
+        gathering["happened"]=happened
+    for replicate,saved in enumerate(meta["daily_infection_reports"]):
+        model.set_infection_report(replicate,{datetime.date.fromisoformat(d):n for d,n in saved})
+    if "event_tick" in arrays:
+        model.events.set_state({name[6:]:values for name,values in arrays.items() if name.startswith("event_")})
+
+    #agents
+    paths=_split(arrays["path_nodes"],arrays["path_offsets"])
+    task_positions=_split(arrays["task_positions"],arrays["task_offsets"])
+    task_durations=_split(arrays["task_durations"],arrays["task_offsets"])
+    task_probabilities=_split(arrays["task_probabilities"],arrays["task_offsets"])
+    for k,saved in enumerate(meta["agents"]):
+        tasks=[[(int(p[0]),int(p[1])),int(d),float(q)] for p,d,q in
+                 zip(task_positions[k].reshape(-1,2),task_durations[k],task_probabilities[k])]
+        shift=[datetime.timedelta(seconds=float(s)) for s in arrays["shift"][k]]
+        a=CovidAgent(model,id,tasks,shift)
+        for name in ("task_type","face","isolation_dur","gathering_remaining_duration","replicate"):
+            setattr(a,name,int(arrays[name][k]))
+        for name in ("speed","inhaled","immunity"):
+            setattr(a,name,float(arrays[name][k]))
+        for name in ("healthy","symptotic","vaccinated","active","is_leaving","isolation_finished"):
+            setattr(a,name,bool(arrays[name][k]))
+        a.pos=(int(arrays["pos"][k,0]),int(arrays["pos"][k,1]))
+        a.node=model.node_id(a.pos)
+        a.stay_dur=None if arrays["stay_dur"][k]<0 else int(arrays["stay_dur"][k])
+        a._path=paths[k].astype(np.int32)
+        cursor=float(arrays["id_in_path"][k])
+        a._id_in_path=cursor if cursor%1 else int(cursor)
+        a.marker,a.color,a.size,a.alpha=saved["marker"],saved["color"],saved["size"],saved["alpha"]
+        a.stream_key=_key(saved["stream_key"])
+        a.infection_time=[_parse_time(t) for t in saved["infection_time"]]
+        a.infection_dates=list(saved["infection_dates"])
+        a.symptom_start_date=_parse_time(saved["symptom_start_date"])
+        a.isolation_time=[_parse_time(t) for t in saved["isolation_time"]]
+        emission=saved.get("emission")
+        if emission is not None:
+            a._emission=[tuple(emission[0]),emission[1],{(t,f):np.array(p) for t,f,p in emission[2]}]
+    model.calendar=None
+    model.array_engine=None
+
+    #random generators
+    variates=meta["variates"]
+    if variates["keys"]!=[repr(k) for k in model.variates._distributions]:
+        raise ValueError("the checkpoint was saved with other random variates")
+    streams=[[name,(version,arrays["stream_states"][k].tolist(),gauss)] for k,(name,version,gauss) in enumerate(variates["streams"])]
+    model.variates.set_state(dict(variates,streams=streams,
+                                  blocks=[arrays["variate_block_"+str(k)] for k in range(len(variates["keys"]))]))
+    if restore_random:
+        version,state,gauss=meta["random"]
+        random.setstate((version,tuple(state),gauss))
+        np_state=meta["np_random"]
+        np.random.set_state((np_state[0],arrays["np_random_keys"])+tuple(np_state[1:]))
+    return model
+
+
+def fork_model(model,count,seeds=None):
+    '''
+    returns count copies of the model that continue from its current state; the copies share
+    the layout, the graph, the path table and the distributions of the model
+    seeds:
+        a seed for the variate pool of each copy, None keeps the state of the variate pool of the model
+    '''
+    if seeds is not None and len(seeds)!=count:
+        raise ValueError("a seed should be given for each branch")
+    if model.array_engine is not None and model.array_engine.n==len(model.agents):
+        model.array_engine.sync_to_agents()
+    shared=[model.layout,model.graph,model.paths,model.interventions,
+              model.left_spread,model.right_spread,model.up_spread,model.down_spread,
+              model._channel_decay]+model._channel_spread+list(model.variates._distributions.values())
+    branches=[]
+    for k in range(count):
+        memo={id(obj):obj for obj in shared}
+        memo[id(model.array_engine)]=None #the engine is created again from the agents
+        branch=copy.deepcopy(model,memo)
+        if seeds is not None:
+            branch.variates.reseed(seeds[k])
+        branches.append(branch)
+    return branches
@@ -1,222 +1,210 @@
 """
-This Python module provides a flexible way to define and test various 
-interventions in an office layout. The module defines different scenarios, 
+This Python module provides a flexible way to define and test various
+interventions in an office layout. The module defines different scenarios,
 such as adding decompression areas, reducing agent cluster sizes in working areas,
- and shifting agent schedules. Each scenario is assigned a unique ID, and by calling 
- the scenario(ID) function, the module returns the relevant layout, agent locations, 
- and agent behavioral characteristics for the given scenario. The module defines 25 
+ and shifting agent schedules. Each scenario is assigned a unique ID, and by calling
+ the scenario(ID) function, the module returns the relevant layout, agent locations,
+ and agent behavioral characteristics for the given scenario. The module defines 25
  scenarios, allowing various interventions to be tested and evaluated.
 
-In this file, there are lines in each intervention as "os.makedir",
-These lines should be "commented" if the directory exists (or uncommented if it does not exist). 
-The directory will then be used to store the simulation results.
+The scenarios are defined as data (SCENARIOS): each scenario spec is a dictionary that only holds
+plain values, i.e. the names of the layout.py functions that transform the base layout and
+locations, the gatherings, the arrival interval, the shifts, the interventions and the percentage of
+workers. compile_scenario turns a spec into the objects used by the model (the layout array, the
+locations, the scipy.stats distributions and the gathering dictionaries); identical compiled layouts
+are shared. expand_grid builds the specs of a factorial design from the levels of several factors,
+and sweep.py runs the replicates of many scenarios together.
+
+The layout figures are not rendered when a scenario is compiled, they are rendered by plot_scenario
+(or by senario(ID, plot=True)) when they are needed.
 """
 
 import layout
 import datetime
+import itertools
 import scipy.stats as st
 import os
+from paths import layout_key
+
+FOLDER=r".\\" #folder of the directories of the simulation results
+
+#location of the gatherings: name -> (key in the locations, index)
+GATHERING_LOCATIONS={"meet1":("meet",0),"meet2":("meet",1),"conference":("conference",0)}
 
-def senario(id):
+#transforms of layout.py: name -> arguments of the function (layout, locations or both)
+TRANSFORMS={"add_1_zone":"layout","add_3_zones":"layout","add_6_zones":"layout",
+            "add_15_zones":"layout","add_33_zones":"layout",
+            "add_1_coffee_area":"locations","add_3_coffee_areas":"locations","add_6_coffee_areas":"locations",
+            "double_washroom_size":"both","triple_washroom_size":"both"}
+
+def meetings(duration=60,sizes=(15,15,15,15),locations=("meet1","meet2","meet1","meet2"),starts=((10,0),(10,0),(11,0),(11,0))):
     """
-        return layout, locations, shifts, meetings, based on senario id
+    returns the gatherings of a spec: (location, (hour, minute), duration in minutes, size)
+    """
+    return [(loc,start,duration,size) for loc,start,size in zip(locations,starts,sizes)]
+
+BASE={"name":"Base",
+      "transforms":[], #names of the TRANSFORMS, applied in order
+      "gatherings":meetings(), #average of 6 to 10 people
+      "interval":("uniform",0,1), #arrival interval in minutes
+      "shifts":[((9,30),(7,0))], #start and duration of each shift as (hour, minute)
+      "interventions":{"isolation":("uniform",0,3)},
+      "workers_percentage":100} #percentage of workers working in the office: decreasing the work density
+
+def spec(name,**changes):
+    """
+    returns the spec of a scenario that differs from BASE in the given values
     """
+    s=dict(BASE,name=name)
+    s.update(changes)
+    return s
+
+SCENARIOS=[
+    spec("Base"), #baseline
+    spec("Add_coffee_1",transforms=["add_1_coffee_area"]),
+    spec("Add_coffee_3",transforms=["add_3_coffee_areas"]),
+    spec("Add_coffee_6",transforms=["add_6_coffee_areas"]),
+    spec("Add_zone_1",transforms=["add_1_zone"]), #add working zones
+    spec("Add_zone_3",transforms=["add_3_zones"]),
+    spec("Add_zone_6",transforms=["add_6_zones"]),
+    spec("Add_zone_15",transforms=["add_15_zones"]),
+    spec("Add_zone_33",transforms=["add_33_zones"]),
+    spec("Arrival_float_30",interval=("uniform",0,30)), #allowing a 30 min floating arrival time
+    spec("Arrival_float_60",interval=("uniform",0,60)),
+    spec("Arrival_float_120",interval=("uniform",0,120)),
+    spec("Arrival_float_180",interval=("uniform",0,180)),
+    spec("meet_room_size",gatherings=meetings(locations=("conference",)*4,starts=((9,30),(10,30),(11,30),(12,30)))), # using the conference room
+    spec("meet_agents_size",gatherings=meetings(sizes=(7,8,8,7))), # decrease number of people in meetings
+    spec("meet_duration_30",gatherings=meetings(duration=30)), # decrease meeting duration to 30 minutes
+    spec("meet_duration_45",gatherings=meetings(duration=45)),
+    spec("Add_shift_1",shifts=[((9,30),(7,0)),((17,0),(7,0))]), #increase number of shifts: 2
+    spec("Workers_4_5th",workers_percentage=80), #Reduce number of workers
+    spec("Workers_2_3rd",workers_percentage=66.6667),
+    spec("Workers_half",workers_percentage=50),
+    # applying normal surgical masks for 66 perentage of times
+    #this isolation only models sick days after symptoms
+    spec("Mask",interventions={"isolation":("uniform",0,3),"mask":[("uniform",42,88-42),17.8]}),
+    # using a 85 percent effective vaccine for 75 percent of workers
+    spec("Vaccine",interventions={"isolation":("uniform",0,3),"vaccine":[("uniform",50,60-50),70.2]}),
+    spec("zone_coffee",transforms=["add_33_zones","add_6_coffee_areas"]), #all in one
+    spec("zone_coffee_meet",transforms=["add_33_zones","add_6_coffee_areas"],gatherings=meetings(duration=30)),
+    spec("all",transforms=["add_33_zones","add_6_coffee_areas"],gatherings=meetings(duration=30),interval=("uniform",0,180)),
+]
+
+_layouts={} #layout key -> compiled layout, identical layouts are shared
+_compiled={} #tuple of transforms -> compiled layout and locations
+
+
+def expand_grid(base,factors):
+    """
+    returns the specs of a full factorial design
+    base:
+        the spec that is changed by the levels of the factors
+    factors:
+        a list with the levels of each factor, a level is a dictionary of the values it changes
+        (and a "name" used to name the scenarios); the transforms of the levels are added to the
+        transforms of the base, the other values replace those of the base
+    e.g. expand_grid(BASE,[[{"name":""},{"name":"zone","transforms":["add_33_zones"]}],
+                          [{"name":"mask","interventions":...},{"name":"vaccine","interventions":...}]])
+    """
+    specs=[]
+    for levels in itertools.product(*factors):
+        s=dict(base)
+        s["transforms"]=list(base["transforms"])
+        names=[]
+        for level in levels:
+            for k,v in level.items():
+                if k=="name":
+                    if v:
+                        names.append(v)
+                elif k=="transforms":
+                    s["transforms"]+=list(v)
+                else:
+                    s[k]=v
+        s["name"]="_".join(names) if names else base["name"]
+        specs.append(s)
+    return specs
+
+
+def _distribution(value):
+    # ("uniform", loc, scale) -> st.uniform(loc, scale)
+    if isinstance(value,(tuple,list)) and len(value)>0 and isinstance(value[0],str):
+        return getattr(st,value[0])(*value[1:])
+    return value
+
+
+def _time(value):
+    return datetime.timedelta(hours=value[0],minutes=value[1])
+
+
+def compile_layout(transforms):
+    """
+    returns the layout and the locations after applying the transforms to the base layout, they are compiled once
+    for each list of transforms; the layout array is shared by all the specs that give the same layout,
+    the layout and the locations should not be modified
+    """
+    transforms=tuple(transforms)
+    if transforms in _compiled:
+        return _compiled[transforms]
     layout_1=layout.create_layout()
     locations=layout.define_locations()
-    [washroom_lower,washroom_upper]=locations["washroom"]
-    [elevator]=locations["elevator"]
-    [desk_lower,desk_upper]=locations["desk"]
-    [coffee_lower,coffee_upper]=locations["coffee"]
-    [conference]=locations["conference"]
-    [meet1,meet2]=locations["meet"]
-    g1={"location":meet1,"start":datetime.time(10,0,0),"duration":60,"size":15} #average of 6 to 10 people
-    g2={"location":meet2,"start":datetime.time(10,0,0),"duration":60,"size":15} #average of 6 to 10 people
-    g3={"location":meet1,"start":datetime.time(11,0,0),"duration":60,"size":15} #average of 6 to 10 people
-    g4={"location":meet2,"start":datetime.time(11,0,0),"duration":60,"size":15} #average of 6 to 10 people
-    interval=st.uniform(0,1)
-    gatherings=[g1,g2,g3,g4]
-    workers_percent=100 #percentage of workers working in the office: decreasing the work density
-    shifts=[[datetime.timedelta(hours=9,minutes=30),datetime.timedelta(hours=7)]]
-    interventions={"isolation":st.uniform(0,3)}
-    
-    folder=r".\\"
-    if id==0:
-        os.mkdir("Base")
-        #baseline
-        file_loc=folder+r"\Base"
-    elif id==1:
-        #os.mkdir("Add_coffee_1")
-        # add_1_coffee_area
-        locations=layout.add_1_coffee_area(locations)
-        file_loc=folder+r"\Add_coffee_1"
-    elif id==2:
-        #os.mkdir("Add_coffee_3")
-        # add_3_coffee_area
-        locations=layout.add_3_coffee_areas(locations)
-        file_loc=folder+r"\Add_coffee_3"
-    elif id==3:
-        #os.mkdir("Add_coffee_6")
-        # add_6_coffee_area
-        locations=layout.add_6_coffee_areas(locations)
-        file_loc=folder+r"\Add_coffee_6"
-    elif id==4:
-        #os.mkdir("Add_zone_1")
-        #add 1 working zone
-        file_loc=folder+r"\Add_zone_1"
-        layout_1=layout.add_1_zone(layout_1)
-    elif id==5:
-        #os.mkdir("Add_zone_3")
-        #add 3 working zone
-        file_loc=folder+r"\Add_zone_3"
-        layout_1=layout.add_3_zones(layout_1)
-    elif id==6:
-        #os.mkdir("Add_zone_6")
-        #add 6 working zone
-        file_loc=folder+r"\Add_zone_6"
-        layout_1=layout.add_6_zones(layout_1)
-    elif id==7:
-        #os.mkdir("Add_zone_15")
-        #add 15 working zone
-        file_loc=folder+r"\Add_zone_15"
-        layout_1=layout.add_15_zones(layout_1)
-    elif id==8:
-        #os.mkdir("Add_zone_33")
-        #add 33 working zone
-        file_loc=folder+r"\Add_zone_33"
-        layout_1=layout.add_33_zones(layout_1)
-    elif id==9:
-        #os.mkdir("Arrival_float_30")
-        #define interval in minutes, allowing a 30 min floating arrival time
-        interval=st.uniform(0,30)
-        file_loc=folder+r"\Arrival_float_30"
-    elif id==10:
-        #os.mkdir("Arrival_float_60")
-        #define interval in minutes, allowing a 30 min floating arrival time
-        interval=st.uniform(0,60)
-        file_loc=folder+r"\Arrival_float_60"
-    elif id==11:
-        #os.mkdir("Arrival_float_120")
-        #define interval in minutes, allowing a 30 min floating arrival time
-        interval=st.uniform(0,120)
-        file_loc=folder+r"\Arrival_float_120"
-    elif id==12:
-        #os.mkdir("Arrival_float_180")
-        #define interval in minutes, allowing a 30 min floating arrival time
-        interval=st.uniform(0,180)
-        file_loc=folder+r"\Arrival_float_180"
-    elif id==13:
-        #os.mkdir("meet_room_size")
-        # using the conference room
-        g1={"location":conference,"start":datetime.time(9,30,0),"duration":60,"size":15} #average of 6 to 10 people
-        g2={"location":conference,"start":datetime.time(10,30,0),"duration":60,"size":15} #average of 6 to 10 people
-        g3={"location":conference,"start":datetime.time(11,30,0),"duration":60,"size":15} #average of 6 to 10 people
-        g4={"location":conference,"start":datetime.time(12,30,0),"duration":60,"size":15} #average of 6 to 10 people
-        gatherings=[g1,g2,g3,g4]
-        file_loc=folder+r"\meet_room_size"
-    elif id==14:
-        #os.mkdir("meet_agents_size")
-        # decrease number of people in meetings
-        g1={"location":meet1,"start":datetime.time(10,0,0),"duration":60,"size":7} #average of 6 to 10 people
-        g2={"location":meet2,"start":datetime.time(10,0,0),"duration":60,"size":8} #average of 6 to 10 people
-        g3={"location":meet1,"start":datetime.time(11,0,0),"duration":60,"size":8} #average of 6 to 10 people
-        g4={"location":meet2,"start":datetime.time(11,0,0),"duration":60,"size":7} #average of 6 to 10 people
-        gatherings=[g1,g2,g3,g4]
-        file_loc=folder+r"\meet_agents_size"
-    elif id==15:
-        #os.mkdir("meet_duration_30")
-        # decrease meeting duration to 30 minutes
-        g1={"location":meet1,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g2={"location":meet2,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g3={"location":meet1,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g4={"location":meet2,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        gatherings=[g1,g2,g3,g4]
-        file_loc=folder+r"\meet_duration_30"
-    elif id==16:
-        #os.mkdir("meet_duration_45")
-        # decrease meeting duration to 45 minutes
-        g1={"location":meet1,"start":datetime.time(10,0,0),"duration":45,"size":15} #average of 6 to 10 people
-        g2={"location":meet2,"start":datetime.time(10,0,0),"duration":45,"size":15} #average of 6 to 10 people
-        g3={"location":meet1,"start":datetime.time(11,0,0),"duration":45,"size":15} #average of 6 to 10 people
-        g4={"location":meet2,"start":datetime.time(11,0,0),"duration":45,"size":15} #average of 6 to 10 people
-        gatherings=[g1,g2,g3,g4]
-        file_loc=folder+r"\meet_duration_45"
-    elif id==17:
-        #os.mkdir("Add_shift_1")
-        #increase number of shifts: 2
-        shifts=[[datetime.timedelta(hours=9,minutes=30),datetime.timedelta(hours=7)],[datetime.timedelta(hours=17),datetime.timedelta(hours=7)]]
-        file_loc=folder+r"\Add_shift_1"
-    elif id==18:
-        #os.mkdir("Workers_4_5th")
-        #Reduce number of workers to 2/3
-        workers_percent=80
-        file_loc=folder+r"\Workers_4_5th"
-    elif id==19:
-        #os.mkdir("Workers_2_3rd")
-        #Reduce number of workers to 2/3
-        workers_percent=66.6667
-        file_loc=folder+r"\Workers_2_3rd"
-    elif id==20:
-        #os.mkdir("Workers_half")
-        #Reduce number of workers to half
-        workers_percent=50
-        file_loc=folder+r"\Workers_half"
-    elif id==21:
-        #os.mkdir("Mask")
-        # applying normal surgical masks for 66 perentage of times
-        #this isolation only models sick days after symptoms
-        interventions={"isolation":st.uniform(0,3),"mask":[st.uniform(42,88-42),17.8]}
-        file_loc=folder+r"\Mask"
-    elif id==22:
-        os.mkdir("Vaccine")
-        # using a 85 percent effective vaccine for 75 percent of workers
-        interventions={"isolation":st.uniform(0,3),"vaccine":[st.uniform(50,60-50),70.2]}
-        file_loc=folder+r"\Vaccine"
-    elif id==23:
-        #all in one
-        #os.mkdir("zone_coffee")
-        layout_1=layout.add_33_zones(layout_1)
-        locations=layout.add_6_coffee_areas(locations)
-        file_loc=folder+r"\zone_coffee"
-    elif id==24:
-        #os.mkdir("zone_coffee_meet")
-    
-        layout_1=layout.add_33_zones(layout_1)
-        locations=layout.add_6_coffee_areas(locations)
-
-        # using the conference room
-        g1={"location":meet1,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g2={"location":meet2,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g3={"location":meet1,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g4={"location":meet2,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-       
-        gatherings=[g1,g2,g3,g4]
-        
-        file_loc=folder+r"\zone_coffee_meet"
-
-    elif id==25:
-        #all in one
-        #os.mkdir("all")
-    
-        layout_1=layout.add_33_zones(layout_1)
-        locations=layout.add_6_coffee_areas(locations)
-
-        # using the conference room
-        g1={"location":meet1,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g2={"location":meet2,"start":datetime.time(10,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g3={"location":meet1,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-        g4={"location":meet2,"start":datetime.time(11,0,0),"duration":30,"size":15} #average of 6 to 10 people
-       
-        gatherings=[g1,g2,g3,g4]
-        
-        interval=st.uniform(0,180)
-        
-        file_loc=folder+r"\all"
-
-
-    #plot layout
-    plt=layout.plot_layout(layout_1,locations)
-    plt.savefig(file_loc+r"\layout.jpg",bbox_inches='tight',dpi=600)
-    plt.savefig(file_loc+r"\layout.pdf",bbox_inches='tight',dpi=600)
+    for name in transforms:
+        f=getattr(layout,name)
+        if TRANSFORMS[name]=="layout":
+            layout_1=f(layout_1)
+        elif TRANSFORMS[name]=="locations":
+            locations=f(locations)
+        else:
+            layout_1,locations=f(layout_1,locations)
+    key=layout_key(layout_1)
+    if key not in _layouts:
+        _layouts[key]=layout_1
+    _compiled[transforms]=(_layouts[key],locations)
+    return _compiled[transforms]
+
+
+def compile_scenario(s,folder=FOLDER):
+    """
+    returns the layout, locations, arrival interval, gatherings, percentage of workers, shifts,
+    interventions and directory of the results of a scenario spec as a dictionary
+    """
+    layout_1,locations=compile_layout(s["transforms"])
+    gatherings=[]
+    for loc,start,duration,size in s["gatherings"]:
+        key,k=GATHERING_LOCATIONS[loc]
+        gatherings.append({"location":locations[key][k],"start":datetime.time(*start),"duration":duration,"size":size})
+    interventions={}
+    for k,v in s["interventions"].items():
+        if isinstance(v,list):
+            interventions[k]=[_distribution(x) for x in v]
+        else:
+            interventions[k]=_distribution(v)
+    return {"name":s["name"],"layout":layout_1,"locations":locations,"interval":_distribution(s["interval"]),
+            "gatherings":gatherings,"workers_percentage":s["workers_percentage"],
+            "shifts":[[_time(start),_time(duration)] for start,duration in s["shifts"]],
+            "interventions":interventions,"file_loc":folder+"\\"+s["name"]}
+
+
+def plot_scenario(context,show=False):
+    """
+    saves the figures of the layout of a compiled scenario in its directory
+    """
+    os.makedirs(context["file_loc"],exist_ok=True)
+    plt=layout.plot_layout(context["layout"],context["locations"])
+    plt.savefig(context["file_loc"]+r"\layout.jpg",bbox_inches='tight',dpi=600)
+    plt.savefig(context["file_loc"]+r"\layout.pdf",bbox_inches='tight',dpi=600)
+    if show:
+        plt.show()
     plt.clf()
-    return layout_1,locations,interval, gatherings,workers_percent,shifts,interventions,file_loc
 
+
+def senario(id,plot=False):
+    """
+        return layout, locations, shifts, meetings, based on senario id
+        the directory of the results is created and, if plot is True, the layout figures are saved in it
+    """
+    c=compile_scenario(SCENARIOS[id])
+    os.makedirs(c["file_loc"],exist_ok=True)
+    if plot:
+        plot_scenario(c)
+    return c["layout"],c["locations"],c["interval"],c["gatherings"],c["workers_percentage"],c["shifts"],c["interventions"],c["file_loc"]
@@ -0,0 +1,129 @@
+"""
+The event log of the CoDiSS model (CovidModel.events).
+The infections, isolations and returns to work are kept in preallocated arrays, one row per event
+(tick, agent number, event type, cell and source of the infection), instead of being printed in the
+time steps. CovidModel(event_verbosity=...) sets what is kept: 0 nothing, 1 the events, 2 the events
+also printed. events() returns them as a structured array and dump saves them in a .csv or .npz file.
+"""
+import datetime
+import numpy as np
+
+#types of the events
+INFECTION=1 #the agent is infected
+TEST_ISOLATION=2 #the agent is isolated after a positive test
+SYMPTOM_ISOLATION=3 #the agent is isolated after the symptoms start
+END_ISOLATION=4 #the agent comes back to work after its isolation
+EVENT_NAMES={INFECTION:"infection",TEST_ISOLATION:"test isolation",SYMPTOM_ISOLATION:"symptom isolation",
+               END_ISOLATION:"end isolation"}
+
+#sources of the infections, -1 for the other events
+INITIAL=0 #infected when the agent is created or by get_infected
+SITE=1 #infected by the quanta inhaled on the site
+CAMP=2 #infected outside work (the camp infection rate)
+SOURCE_NAMES={-1:"",INITIAL:"initial",SITE:"site",CAMP:"camp"}
+
+FIELDS=(("tick",np.int64),("agent",np.int64),("event",np.int8),("cell",np.int64),("source",np.int8))
+
+
+class EventLog():
+    def __init__(self,verbosity=1,start=None,capacity=1024):
+        '''
+        verbosity:
+            0 keeps no events, 1 keeps the events, 2 keeps and prints them
+        start:
+            datetime of the tick 0, used to print the time of the events
+        capacity:
+            number of events for which the arrays are allocated at first
+        '''
+        if verbosity not in (0,1,2):
+            raise ValueError("the verbosity of the event log should be 0, 1 or 2")
+        self.verbosity=verbosity
+        self.start=start
+        self.count=0
+        self._columns={name:np.zeros(capacity,dtype=dtype) for name,dtype in FIELDS}
+
+    def __len__(self):
+        return self.count
+
+    def add(self,tick,agent,event,cell=-1,source=-1):
+        '''
+        logs an event of an agent (its number in model.agents) at the given tick; cell is the node of the
+        agent (-1 if the event has no cell), source is the source of an infection
+        '''
+        if self.verbosity==0:
+            return
+        k=self.count
+        columns=self._columns
+        if k==len(columns["tick"]):
+            for name in columns:
+                columns[name]=np.concatenate((columns[name],np.zeros(max(1,k),dtype=columns[name].dtype)))
+        columns["tick"][k]=tick
+        columns["agent"][k]=agent
+        columns["event"][k]=event
+        columns["cell"][k]=cell
+        columns["source"][k]=source
+        self.count=k+1
+        if self.verbosity==2:
+            print(self.format(k))
+
+    def format(self,k):
+        '''
+        returns the event k as a line of text
+        '''
+        tick,agent,event,cell,source=(int(self._columns[name][k]) for name,_ in FIELDS)
+        time=tick if self.start is None else self.start+datetime.timedelta(seconds=tick)
+        line="%s: agent %d %s"%(time,agent,EVENT_NAMES[event])
+        if source>=0:
+            line+=" (%s)"%SOURCE_NAMES[source]
+        if cell>=0:
+            line+=" at node %d"%cell
+        return line
+
+    def events(self):
+        '''
+        returns a copy of the logged events as a numpy structured array with the fields tick, agent,
+        event, cell and source
+        '''
+        records=np.zeros(self.count,dtype=list(FIELDS))
+        for name,_ in FIELDS:
+            records[name]=self._columns[name][:self.count]
+        return records
+
+    def clear(self):
+        '''
+        removes all the logged events
+        '''
+        self.count=0
+
+    def get_state(self):
+        '''
+        returns the logged events as a dictionary of arrays (see set_state)
+        '''
+        return {name:self._columns[name][:self.count].copy() for name,_ in FIELDS}
+
+    def set_state(self,state):
+        '''
+        replaces the logged events with the arrays returned by get_state
+        '''
+        self.count=len(state["tick"])
+        capacity=max(self.count,len(self._columns["tick"]))
+        for name,dtype in FIELDS:
+            self._columns[name]=np.zeros(capacity,dtype=dtype)
+            self._columns[name][:self.count]=state[name]
+
+    def dump(self,file_name):
+        '''
+        saves the logged events in a file: a .csv file has a line for each event with the names of the
+        event types and sources, any other file is saved as a compressed .npz file with an array for each field
+        '''
+        if str(file_name).endswith(".csv"):
+            with open(file_name,"w") as f:
+                f.write("tick,time,agent,event,cell,source\n")
+                columns=self._columns
+                for k in range(self.count):
+                    tick=int(columns["tick"][k])
+                    time="" if self.start is None else (self.start+datetime.timedelta(seconds=tick)).isoformat()
+                    f.write("%d,%s,%d,%s,%d,%s\n"%(tick,time,columns["agent"][k],EVENT_NAMES[int(columns["event"][k])],
+                                                     columns["cell"][k],SOURCE_NAMES[int(columns["source"][k])]))
+        else:
+            np.savez_compressed(file_name,**self.get_state())
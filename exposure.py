@@ -0,0 +1,86 @@
+"""
+Batched kernels for the emission and inhalation of virus quanta.
+They do for all the agents of a time step at once what CovidAgent.emit_quanta and
+CovidAgent.inhaling do for one agent: the emissions are scatter-added to the quanta matrix and the
+concentrations at the cells of the healthy agents are gathered with one fancy-index operation.
+With replicates the quanta matrix is (W, H, 4, R) and the replicate of each agent is given in r.
+compensated_add is Kahan's summation, used for the sums of the single precision fields.
+"""
+import numpy as np
+
+
+def _cells(x,y,r):
+    return (x,y) if r is None else (x,y,r)
+
+
+def _channels_last(quanta_matrix,r):
+    # a (W, H, R, 4) view of a batched quanta matrix, so that (x, y, r) selects the channels of a cell
+    return quanta_matrix if r is None else np.moveaxis(quanta_matrix,3,2)
+
+
+def emit(quanta_matrix,x,y,quanta,r=None):
+    '''
+    adds the quanta emitted by the agents at cells (x[k], y[k]) to the quanta matrix
+    quanta:
+        array with one row of channel values per emitting agent
+    r:
+        replicate of each agent (None if the model runs a single replicate)
+    '''
+    np.add.at(_channels_last(quanta_matrix,r),_cells(x,y,r),quanta)
+
+
+def compensated_add(total,compensation,index,values):
+    '''
+    adds values to total[index] with Kahan's compensated summation; compensation has the shape of
+    total and keeps the part of the previous additions that was lost by rounding; index should not
+    select a cell twice
+    '''
+    s=total[index]
+    y=values-compensation[index]
+    t=np.asarray(s+y,dtype=total.dtype) #rounded to the precision of total
+    compensation[index]=(t-s)-y
+    total[index]=t
+
+
+def _compensated_add_at(total,compensation,cells,values):
+    # np.add.at with compensated summation: the values of the same cell are added together first
+    flat=np.ravel_multi_index(cells,total.shape)
+    unique,inverse=np.unique(flat,return_inverse=True)
+    compensated_add(total,compensation,np.unravel_index(unique,total.shape),np.bincount(inverse,weights=values))
+
+
+def concentrations(quanta_matrix,x,y,r=None):
+    '''
+    returns the channels of the quanta matrix at cells (x[k], y[k]), one row for each agent
+    '''
+    return _channels_last(quanta_matrix,r)[_cells(x,y,r)]
+
+
+def inhale(quanta_matrix,total_inhaled_matrix,infection_matrix,x,y,inhalation_rate,mask_factor=1,r=None,
+           compensation=None,channels=None):
+    '''
+    returns the quanta inhaled by the agents at cells (x[k], y[k]) and adds them to the
+    total inhaled matrix and the infection matrix (Wells-Riley equation)
+    inhalation_rate, mask_factor:
+        inhalation rate and mask factor of each agent
+    r:
+        replicate of each agent (None if the model runs a single replicate)
+    compensation:
+        the compensation matrices ("total_inhaled_matrix" and "infection_matrix") of compensated_add,
+        None adds the doses with np.add.at
+    channels:
+        the concentrations inhaled by the agents (see concentrations), None reads them from the quanta matrix
+    '''
+    if channels is None:
+        channels=concentrations(quanta_matrix,x,y,r)
+    inhaled_now=inhalation_rate*channels.sum(axis=1)*mask_factor
+    exposed=inhaled_now>0
+    if exposed.any():
+        cells=_cells(x[exposed],y[exposed],None if r is None else r[exposed])
+        if compensation is None:
+            np.add.at(total_inhaled_matrix,cells,inhaled_now[exposed])
+            np.add.at(infection_matrix,cells,1-np.exp(-inhaled_now[exposed]))
+        else:
+            _compensated_add_at(total_inhaled_matrix,compensation["total_inhaled_matrix"],cells,inhaled_now[exposed])
+            _compensated_add_at(infection_matrix,compensation["infection_matrix"],cells,1-np.exp(-inhaled_now[exposed]))
+    return inhaled_now
@@ -0,0 +1,221 @@
+"""
+Graph backends of the ABS module.
+The graph of a layout has a node for each cell (ids i*h+j) and edges between the cells that are not
+separated by a wall. NetworkxGraph keeps the networkx.Graph of ABS.model.make_graph; CSRGraph builds
+the edges of the whole layout with array operations, keeps them in a scipy.sparse CSR matrix and
+routes with scipy.sparse.csgraph.dijkstra. Both return shortest paths, but not necessarily the same
+one when several paths have the same length.
+"""
+import numpy as np
+import networkx as nx
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+DIAGONAL_WEIGHT=1.414
+
+
+def grid_edges(layout):
+    '''
+    returns the edges of the graph of the layout as three arrays (first node, second node, weight),
+    using the same rules as ABS.model.make_graph; cells with a value of 4 have no edges
+    '''
+    a=np.asarray(layout)
+    w,h=a.shape
+    ids=np.arange(w*h).reshape(w,h)
+    u,v,weight=[],[],[]
+
+    def add(mask,first,second,edge_weight):
+        u.append(first[mask])
+        v.append(second[mask])
+        weight.append(np.full(int(mask.sum()),edge_weight))
+
+    #edge to (i, j+1) from the cells with a value of 0 or 2
+    c=a[:,:-1]
+    add((c==0)|(c==2),ids[:,:-1],ids[:,1:],1)
+    #edge to (i+1, j) from the cells with a value of 0 or 1
+    c=a[:-1,:]
+    add((c==0)|(c==1),ids[:-1,:],ids[1:,:],1)
+    #diagonal to (i+1, j+1)
+    c,right,down=a[:-1,:-1],a[:-1,1:],a[1:,:-1]
+    mask=(c==0)&((right==0)|(right==1))&((down==2)|(down==0))
+    add(mask,ids[:-1,:-1],ids[1:,1:],DIAGONAL_WEIGHT)
+    #diagonal to (i+1, j-1)
+    left,c,down_left,down=a[:-1,:-1],a[:-1,1:],a[1:,:-1],a[1:,1:]
+    mask=(left==0)&((c==1)|(c==0))&((down_left==0)|(down_left==2))&(down!=4)
+    add(mask,ids[:-1,1:],ids[1:,:-1],DIAGONAL_WEIGHT)
+
+    u,v,weight=np.concatenate(u),np.concatenate(v),np.concatenate(weight)
+    blocked=(a==4).ravel()
+    keep=~blocked[u]&~blocked[v]
+    return u[keep],v[keep],weight[keep]
+
+
+def trace(predecessors,source,destination):
+    '''
+    returns the path from source to destination as a list of node ids, walking back a predecessor
+    row of source (see predecessor_row); None if there is no path
+    '''
+    path=[destination]
+    node=destination
+    while node!=source:
+        node=int(predecessors[node])
+        if node<0:
+            return None
+        path.append(node)
+    path.reverse()
+    return path
+
+
+class NetworkxGraph():
+    name="networkx"
+
+    def __init__(self,graph):
+        '''
+        graph:
+            the networkx.Graph of the layout
+        '''
+        self.graph=graph
+        self.n=max(graph.nodes,default=-1)+1 #length of the predecessor rows
+
+    def __contains__(self,node):
+        return node in self.graph
+
+    def neighbors(self,node):
+        return self.graph.neighbors(node)
+
+    def number_of_nodes(self):
+        return self.graph.number_of_nodes()
+
+    def to_networkx(self):
+        return self.graph
+
+    def shortest_path(self,source,destination):
+        '''
+        returns the shortest path between two nodes as a list of node ids,
+        raises nx.NetworkXNoPath if there is no path between the nodes
+        '''
+        return nx.dijkstra_path(self.graph,source,destination)
+
+    def shortest_paths(self,source,destinations):
+        '''
+        returns a dictionary with the shortest path from source to each destination
+        (None if there is no path), using a single search
+        '''
+        tree=nx.single_source_dijkstra_path(self.graph,source)
+        return {d:tree.get(d) for d in destinations}
+
+    def predecessor_row(self,source,limit=np.inf):
+        '''
+        returns the predecessor of each node on a shortest path from source as an int32 array
+        (-9999 for the source itself and the nodes that are unreachable or farther than limit)
+        '''
+        predecessors,_=nx.dijkstra_predecessor_and_distance(self.graph,source,
+                                                              cutoff=None if limit==np.inf else limit)
+        row=np.full(self.n,-9999,dtype=np.int32)
+        for node,p in predecessors.items():
+            if p:
+                row[node]=p[0]
+        return row
+
+
+class CSRGraph():
+    name="csr"
+
+    def __init__(self,layout):
+        '''
+        creates the graph of the layout as a symmetric CSR matrix of edge weights
+        '''
+        a=np.asarray(layout)
+        w,h=a.shape
+        self.n=w*h
+        self._height=h
+        self._blocked=(a==4).ravel()
+        u,v,weight=grid_edges(a)
+        #an edge may be added by two rules, keep it once
+        first,second=np.minimum(u,v),np.maximum(u,v)
+        _,unique=np.unique(first*self.n+second,return_index=True)
+        u,v,weight=first[unique],second[unique],weight[unique]
+        self.matrix=coo_matrix((np.concatenate((weight,weight)),(np.concatenate((u,v)),np.concatenate((v,u)))),
+                                 shape=(self.n,self.n)).tocsr()
+
+    def __contains__(self,node):
+        return 0<=node<self.n and not self._blocked[node]
+
+    def _check(self,node):
+        if node not in self:
+            raise nx.NodeNotFound("Node %s not found in graph"%node)
+
+    def neighbors(self,node):
+        self._check(node)
+        return iter(self.matrix.indices[self.matrix.indptr[node]:self.matrix.indptr[node+1]].tolist())
+
+    def number_of_nodes(self):
+        return int(self.n-self._blocked.sum())
+
+    def to_networkx(self):
+        '''
+        returns the graph as a networkx.Graph (e.g. for plotting)
+        '''
+        g=nx.Graph()
+        for node in np.flatnonzero(~self._blocked).tolist():
+            g.add_node(node,pos=divmod(node,self._height))
+        m=self.matrix.tocoo()
+        upper=m.row<m.col
+        g.add_weighted_edges_from(zip(m.row[upper].tolist(),m.col[upper].tolist(),m.data[upper].tolist()))
+        return g
+
+    def predecessors(self,sources):
+        '''
+        returns the distances and the predecessor matrix of the shortest paths from each source
+        (one row per source; -9999 for the source itself and the unreachable nodes)
+        '''
+        for s in np.atleast_1d(sources):
+            self._check(int(s))
+        return dijkstra(self.matrix,directed=False,indices=sources,return_predecessors=True)
+
+    def predecessor_row(self,source,limit=np.inf):
+        '''
+        returns the predecessor of each node on a shortest path from source as an int32 array
+        (-9999 for the source itself and the nodes that are unreachable or farther than limit)
+        '''
+        self._check(source)
+        return dijkstra(self.matrix,directed=False,indices=source,return_predecessors=True,limit=limit)[1]
+
+    def nearest_source(self,sources):
+        '''
+        multi-source search: returns the distance of each node to the nearest source, the predecessors
+        on the path from that source and the source itself (-9999 for unreachable nodes)
+        '''
+        for s in sources:
+            self._check(int(s))
+        return dijkstra(self.matrix,directed=False,indices=sources,return_predecessors=True,min_only=True)
+
+    def shortest_path(self,source,destination):
+        '''
+        returns the shortest path between two nodes as a list of node ids,
+        raises nx.NetworkXNoPath if there is no path between the nodes
+        '''
+        self._check(destination)
+        path=self.shortest_paths(source,[destination])[destination]
+        if path is None:
+            raise nx.NetworkXNoPath("No path between %s and %s."%(source,destination))
+        return path
+
+    def shortest_paths(self,source,destinations):
+        '''
+        returns a dictionary with the shortest path from source to each destination
+        (None if there is no path), using a single search
+        '''
+        row=self.predecessor_row(source)
+        return {d:trace(row,source,d) for d in destinations}
+
+
+def make_graph_backend(model,backend):
+    '''
+    returns the graph of the layout of an ABS model for the given backend, "csr" or "networkx"
+    '''
+    if backend=="csr":
+        return CSRGraph(model.layout)
+    if backend=="networkx":
+        return NetworkxGraph(model.make_graph())
+    raise ValueError("graph_backend should be either 'csr' or 'networkx'")
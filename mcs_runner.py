@@ -0,0 +1,272 @@
+"""
+Runner of the Monte Carlo simulation (MCS) of the CoDiSS model.
+run_mcs spreads the replicates of a scenario over a process pool (workers=1 runs them in this
+process). Each replicate has its own seed derived from the base seed and its number, and the results
+are reduced in the order of the replicate numbers, so they do not depend on the number of workers.
+The replicates can be saved in a ResultStore and resumed (see result_store.py), and a stop rule such
+as TargetPrecision ends the runs once the confidence interval of an output is narrow enough.
+MCSResults is the reducer used in case_study_MCS.py; paired_difference compares two scenarios run
+with the same seeds replicate by replicate.
+"""
+import random
+import numpy as np
+import scipy.stats as st
+from concurrent.futures import ProcessPoolExecutor,as_completed
+
+_context=None #context of the replicates run by this process
+
+
+def replicate_seed(base_seed,index):
+    '''
+    returns the seed of replicate number index
+    '''
+    return int(np.random.SeedSequence([base_seed,index]).generate_state(1)[0])
+
+
+def _initialize(initializer,initargs):
+    global _context
+    _context=initializer(*initargs) if initializer is not None else None
+
+
+def _run_replicate(run_replicate,index,seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return index,run_replicate(index,seed,_context)
+
+
+def run_mcs(run_replicate,replicates,base_seed=0,workers=None,initializer=None,initargs=(),reducer=None,
+            store=None,stop=None):
+    '''
+    runs the replicates of a Monte Carlo simulation and returns the reducer
+    run_replicate:
+        a module level function run_replicate(index, seed, context) that runs one replicate and
+        returns its results (or a list of results for a batch of replicates);
+        context is the value returned by the initializer in the process
+    replicates:
+        number of replicates (the maximum number of replicates with a stop rule)
+    workers:
+        number of processes (None for the number of cores); 1 runs the replicates in this process
+    initializer, initargs:
+        a module level function called with initargs once in each process, its value is the context
+    reducer:
+        an object with an add(results) method, called with the results of the replicates in the order
+        of their numbers; MCSResults() if None
+    store:
+        a ResultStore that saves the results of each replicate when it finishes; the replicates
+        already saved in it are loaded instead of being run
+    stop:
+        a function stop(reducer) called after each replicate is reduced, the simulation stops when it
+        returns True (e.g. TargetPrecision)
+    '''
+    global _context
+    if reducer is None:
+        reducer=MCSResults()
+    seeds=[replicate_seed(base_seed,i) for i in range(replicates)]
+    remaining=[i for i in range(replicates) if store is None or i not in store]
+    if workers==1:
+        previous=_context
+        if remaining:
+            _initialize(initializer,initargs)
+        try:
+            for i in range(replicates):
+                if i in remaining:
+                    results=_run_replicate(run_replicate,i,seeds[i])[1]
+                    if store is not None:
+                        store.save(i,results)
+                else:
+                    results=store.load(i)
+                _reduce(reducer,results)
+                if stop is not None and stop(reducer):
+                    break
+        finally:
+            _context=previous
+        return reducer
+
+    pending={} #results that arrived before the results of a smaller replicate number
+    next_index=0
+    stopped=False
+
+    def reduce_ready():
+        nonlocal next_index,stopped
+        while next_index<replicates and not stopped:
+            if next_index in pending:
+                _reduce(reducer,pending.pop(next_index))
+            elif store is not None and next_index in store:
+                _reduce(reducer,store.load(next_index))
+            else:
+                break
+            next_index+=1
+            stopped=stop is not None and stop(reducer)
+
+    reduce_ready()
+    if not remaining or stopped:
+        return reducer
+    executor=ProcessPoolExecutor(max_workers=workers,initializer=_initialize,initargs=(initializer,initargs))
+    error=None
+    try:
+        futures=[executor.submit(_run_replicate,run_replicate,i,seeds[i]) for i in remaining]
+        for future in as_completed(futures):
+            try:
+                index,results=future.result()
+            except Exception as ex:
+                #keep saving the replicates that finish, the error is raised at the end
+                error=error or ex
+                continue
+            if store is not None:
+                store.save(index,results)
+            pending[index]=results
+            reduce_ready()
+            if stopped:
+                break
+    finally:
+        #when the rule stops the simulation, the replicates that are not started yet are cancelled and
+        #the replicates that are already running are not waited for (their results are discarded)
+        executor.shutdown(wait=not stopped,cancel_futures=True)
+    if error is not None:
+        raise error
+    return reducer
+
+
+def _reduce(reducer,results):
+    if isinstance(results,list):
+        for r in results:
+            reducer.add(r)
+    else:
+        reducer.add(results)
+
+
+def model_results(model,replicate=None):
+    '''
+    returns the outputs of a model after its run, as used by MCSResults;
+    replicate selects one replicate of a model that runs several replicates
+    '''
+    def select(matrix):
+        return matrix if replicate is None else matrix[...,replicate]
+    rate,dates,numbers=model.attack_rate(replicate or 0)
+    return {"effective_p_matrix":select(model.effective_infection_probability_matrix()),
+            "p_matrix":select(model.infection_probability_matrix()),
+            "expected_number_matrix":select(model.infection_matrix).copy(),
+            "daily_infection_report":model.infection_report(replicate or 0),
+            "attack_rate":rate,
+            "infected_dates":dates,
+            "infected_number":np.cumsum(np.array(numbers))}
+
+
+def replicate_results(model):
+    '''
+    returns the list of the outputs of all the replicates of a model (a single item if the model
+    runs a single replicate)
+    '''
+    if model.replicates is None:
+        return [model_results(model)]
+    return [model_results(model,r) for r in range(model.replicates)]
+
+
+class MCSResults():
+    def __init__(self):
+        '''
+        sums the matrices and collects the daily reports and attack rates of the replicates
+        '''
+        self.replicates=0
+        self.effective_p_matrix=None
+        self.p_matrix=None
+        self.expected_number_matrix=None
+        self.daily_infection_report={}
+        self.attack_rates=[]
+        self.infected_dates=[]
+        self.infected_number=[]
+        self._m2={} #sums of the squared deviations of the matrices from their means
+
+    def add(self,results):
+        '''
+        adds the results of a replicate, as returned by model_results
+        '''
+        n=self.replicates+1
+        for name in ("effective_p_matrix","p_matrix","expected_number_matrix"):
+            total=getattr(self,name)
+            if total is None:
+                total=np.zeros_like(results[name],dtype=np.float64)
+                setattr(self,name,total)
+                self._m2[name]=np.zeros_like(total)
+            #Welford's update of the sum of the squared deviations
+            delta=results[name]-(total/(n-1) if n>1 else 0)
+            total+=results[name]
+            self._m2[name]+=delta*(results[name]-total/n)
+        for day,number in results["daily_infection_report"].items():
+            if day not in self.daily_infection_report:
+                self.daily_infection_report[day]=[]
+            self.daily_infection_report[day].append(number)
+        self.attack_rates.append(results["attack_rate"])
+        self.infected_dates.append(results["infected_dates"])
+        self.infected_number.append(results["infected_number"])
+        self.replicates+=1
+
+    def mean_matrices(self):
+        '''
+        returns the effective infection probability, infection probability and expected number of
+        infections matrices averaged over the replicates
+        '''
+        return (self.effective_p_matrix/self.replicates,self.p_matrix/self.replicates,
+                self.expected_number_matrix/self.replicates)
+
+    def half_width(self,output="attack_rates",confidence=0.95):
+        '''
+        returns the half-width of the confidence interval (Student t) of the mean of an output over the
+        replicates: "attack_rates", "infected_number" (the final number of infections) or the name of a
+        matrix, e.g. "effective_p_matrix", for which the largest half-width of its cells is returned
+        '''
+        n=self.replicates
+        if n<2:
+            return np.inf
+        if output in self._m2:
+            sd=np.sqrt(self._m2[output].max()/(n-1))
+        else:
+            sd=np.std(_values(self,output),ddof=1)
+        return st.t.ppf((1+confidence)/2,n-1)*sd/np.sqrt(n)
+
+
+class TargetPrecision():
+    def __init__(self,output="attack_rates",half_width=1.0,confidence=0.95,min_replicates=10):
+        '''
+        stop rule of run_mcs and run_sweep: stops when the half-width of the confidence interval of
+        the mean of an output of MCSResults is at most half_width (see MCSResults.half_width), e.g.
+        TargetPrecision("attack_rates", 1.0) for +-1 percent on the attack rate or
+        TargetPrecision("effective_p_matrix", 0.02) for +-0.02 on every cell of the probability map
+        min_replicates:
+            number of replicates run before the precision is checked
+        '''
+        self.output=output
+        self.half_width=half_width
+        self.confidence=confidence
+        self.min_replicates=max(min_replicates,2)
+
+    def __call__(self,results):
+        if results.replicates<self.min_replicates:
+            return False
+        return results.half_width(self.output,self.confidence)<=self.half_width
+
+
+def _values(results,output):
+    # the values of an output of the replicates, the final number of infections for "infected_number"
+    values=getattr(results,output)
+    if output=="infected_number":
+        values=[n[-1] if len(n)>0 else 0 for n in values]
+    return np.asarray(values,dtype=np.float64)
+
+
+def paired_difference(base,other,output="attack_rates",confidence=0.95):
+    '''
+    returns the mean of the differences (other - base) of an output of two MCSResults, paired by
+    replicate number, and its confidence interval (Student t); the output is the name of a list of
+    values of the replicates, e.g. "attack_rates", or "infected_number" for the final number of infections;
+    when the results were stopped after different numbers of replicates, the replicates run for both are paired
+    '''
+    a=_values(base,output)
+    b=_values(other,output)
+    n=min(len(a),len(b))
+    d=b[:n]-a[:n]
+    mean=d.mean()
+    if len(d)<2:
+        return mean,(np.nan,np.nan)
+    half=st.t.ppf((1+confidence)/2,len(d)-1)*d.std(ddof=1)/np.sqrt(len(d))
+    return mean,(mean-half,mean+half)
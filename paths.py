@@ -0,0 +1,256 @@
+"""
+The shortest path table shared by the agents and the runs of a layout.
+The tasks of each crew are registered as routes (add_routes) and precompute finds the paths between
+them, searching each pair once from the end shared by more routes; the reverse of a path is kept as
+well. The other paths (e.g. to a gathering cell) are traced on demand from the predecessor rows of
+the latest searches, kept within ROW_BUDGET. A PathService is shared by the models of the same
+layout in a process (shared_path_service) and can be saved in a .npz file named after a hash of the
+layout; hits and searches are counted for the profiler (see profiler.py).
+"""
+import hashlib
+import os
+from collections import OrderedDict
+import tempfile
+import time
+import zipfile
+import numpy as np
+import networkx as nx
+from graph_backend import trace,DIAGONAL_WEIGHT
+
+_services={} #layout key -> PathService
+CACHE_VERSION=2 #version of the node ids used in the cache files
+ROW_BUDGET=2**24 #node entries of the predecessor rows kept for the searches on demand
+DETOUR=2.0 #the searches of precompute stop at DETOUR times the grid distance of the farthest destination
+DETOUR_MARGIN=10 #plus this distance; the destinations not reached are found by a full search
+
+
+def layout_key(layout):
+    '''
+    returns a hash of the layout array, the graph of the model is fully defined by the layout
+    '''
+    layout=np.ascontiguousarray(layout)
+    h=hashlib.sha1(str(layout.shape).encode())
+    h.update(layout.astype(np.int64).tobytes())
+    return h.hexdigest()
+
+
+def shared_path_service(graph,layout,cache_dir=None):
+    '''
+    returns the PathService of the layout and graph backend, it is created (and loaded from
+    cache_dir if saved before) the first time it is requested in the process
+    '''
+    key=(layout_key(layout),graph.name)
+    if key not in _services:
+        _services[key]=PathService(graph,layout,cache_dir)
+    service=_services[key]
+    if cache_dir is not None and service.cache_dir is None:
+        service.cache_dir=cache_dir
+        service.load()
+    return service
+
+
+class PathService():
+    def __init__(self,graph,layout,cache_dir=None):
+        '''
+        graph:
+            graph backend of the model, the nodes are the ids i*h+j of the cells (see graph_backend.py)
+        layout:
+            layout of the model, used to number the nodes and to name the cache file
+        cache_dir:
+            directory of the cache file (None to keep the paths in memory only)
+        '''
+        self.graph=graph
+        self.key=layout_key(layout)
+        self._node_h=layout.shape[1]
+        self.cache_dir=cache_dir
+        self.locations=set() #points of interest (node ids)
+        self.routes={} #source -> destinations of the tasks of the crews
+        self._paths={} #(source, destination) -> array of node ids, None if there is no path
+        self._rows=OrderedDict() #source -> predecessor row, most recently used last
+        self._max_rows=max(1,ROW_BUDGET//graph.n)
+        self._changed=False
+        self.hits=0 #requests answered from the table or from a kept predecessor row
+        self.searches=0 #Dijkstra searches
+        self.search_time=0.0 #seconds spent in the searches
+        if cache_dir is not None:
+            self.load()
+
+    def file_name(self):
+        return os.path.join(self.cache_dir,"paths_"+str(CACHE_VERSION)+"_"+self.graph.name+"_"+self.key+".npz")
+
+    def _nodes(self,locations):
+        # node ids of locations given as node ids or (i, j) positions, without the nodes out of the graph
+        nodes=[]
+        for loc in locations:
+            if not isinstance(loc,(int,np.integer)):
+                loc=int(loc[0])*self._node_h+int(loc[1])
+            if loc in self.graph:
+                nodes.append(int(loc))
+        return nodes
+
+    def add_locations(self,locations):
+        '''
+        adds points of interest, given as node ids or (i, j) positions; the searches on demand
+        between a point of interest and another node are run from the point of interest
+        '''
+        self.locations.update(self._nodes(locations))
+
+    def add_routes(self,locations):
+        '''
+        adds the routes between each two of the locations (e.g. the tasks of a crew), given as
+        node ids or (i, j) positions; their paths are found by precompute
+        '''
+        nodes=self._nodes(locations)
+        self.locations.update(nodes)
+        for s in nodes:
+            self.routes.setdefault(s,set()).update(d for d in nodes if d!=s)
+
+    def _distance(self,source,destination):
+        # lower bound of the length of the paths between two nodes
+        di,dj=divmod(source,self._node_h)
+        i,j=divmod(destination,self._node_h)
+        di,dj=abs(di-i),abs(dj-j)
+        return max(di,dj)+(DIAGONAL_WEIGHT-1)*min(di,dj)
+
+    def _add(self,source,destination,p):
+        # keeps a path found from source and its reverse
+        if p is not None:
+            p=np.array(p,dtype=np.int32)
+        self._paths[(source,destination)]=p
+        self._paths[(destination,source)]=None if p is None else p[::-1]
+        self._changed=True
+
+    def _search(self,source,destinations):
+        # a single search from source, that stops near the farthest destination
+        start=time.perf_counter()
+        limit=DETOUR*max(self._distance(source,d) for d in destinations)+DETOUR_MARGIN
+        row=self.graph.predecessor_row(source,limit)
+        self.searches+=1
+        missing=[]
+        for d in destinations:
+            p=trace(row,source,d)
+            if p is None:
+                missing.append(d)
+            else:
+                self._add(source,d,p)
+        if missing:
+            row=self.graph.predecessor_row(source)
+            self.searches+=1
+            for d in missing:
+                self._add(source,d,trace(row,source,d))
+        self.search_time+=time.perf_counter()-start
+
+    def precompute(self):
+        '''
+        finds the paths of the routes that are not known yet; each pair of locations is searched
+        once, from the location with more routes
+        '''
+        pairs=set()
+        for s,destinations in self.routes.items():
+            for d in destinations:
+                if (s,d) not in self._paths:
+                    if (d,s) in self._paths:
+                        self._add(d,s,self._paths[(d,s)])
+                    else:
+                        pairs.add((min(s,d),max(s,d)))
+        degree={}
+        for pair in pairs:
+            for node in pair:
+                degree[node]=degree.get(node,0)+1
+        searches={} #source -> destinations
+        for a,b in sorted(pairs):
+            if (degree[a],-a)>=(degree[b],-b):
+                searches.setdefault(a,[]).append(b)
+            else:
+                searches.setdefault(b,[]).append(a)
+        for source,destinations in searches.items():
+            self._search(source,destinations)
+
+    def _row(self,source):
+        # the predecessor row of source, searched if it is not kept
+        if source in self._rows:
+            self._rows.move_to_end(source)
+            self.hits+=1
+            return self._rows[source]
+        start=time.perf_counter()
+        row=self.graph.predecessor_row(source)
+        self._rows[source]=row
+        while len(self._rows)>self._max_rows:
+            self._rows.popitem(last=False)
+        self.searches+=1
+        self.search_time+=time.perf_counter()-start
+        return row
+
+    def path(self,source,destination):
+        '''
+        returns the shortest path between two nodes as an int32 array of node ids,
+        the array is shared and should not be modified;
+        raises nx.NetworkXNoPath if there is no path between the nodes
+        '''
+        key=(source,destination)
+        if key in self._paths:
+            self.hits+=1
+        else:
+            for node in key:
+                if node not in self.graph:
+                    raise nx.NodeNotFound("Node %s not found in graph"%node)
+            if source==destination:
+                self._add(source,destination,[source])
+            elif destination in self._rows or (destination in self.locations and source not in self.locations
+                                                 and source not in self._rows):
+                self._add(destination,source,trace(self._row(destination),destination,source))
+            else:
+                self._add(source,destination,trace(self._row(source),source,destination))
+        p=self._paths[key]
+        if p is None:
+            raise nx.NetworkXNoPath("No path between %s and %s."%(source,destination))
+        return p
+
+    def save(self):
+        '''
+        saves all the known paths in the cache file, if there are new paths; the paths saved by
+        other processes are merged first, and the file is replaced at once so that the processes
+        reading it never see a partial file
+        '''
+        if self.cache_dir is None or not self._changed:
+            return
+        self.load()
+        keys=list(self._paths)
+        found=[self._paths[k] for k in keys if self._paths[k] is not None]
+        lengths=[0 if self._paths[k] is None else len(self._paths[k]) for k in keys]
+        os.makedirs(self.cache_dir,exist_ok=True)
+        handle,temp=tempfile.mkstemp(suffix=".tmp",dir=self.cache_dir)
+        try:
+            with os.fdopen(handle,"wb") as f:
+                np.savez(f,
+                         sources=np.array([k[0] for k in keys],dtype=np.int64),
+                         destinations=np.array([k[1] for k in keys],dtype=np.int64),
+                         offsets=np.concatenate(([0],np.cumsum(lengths))).astype(np.int64),
+                         nodes=np.concatenate(found) if found else np.zeros(0,dtype=np.int32),
+                         locations=np.array(sorted(self.locations),dtype=np.int64))
+            os.replace(temp,self.file_name())
+        except BaseException:
+            os.remove(temp)
+            raise
+        self._changed=False
+
+    def load(self):
+        '''
+        loads the paths saved in the cache file, if it exists; an unreadable file is ignored
+        (it is written again by save)
+        '''
+        if self.cache_dir is None or not os.path.exists(self.file_name()):
+            return
+        try:
+            with np.load(self.file_name()) as data:
+                nodes=data["nodes"].astype(np.int32)
+                offsets=data["offsets"]
+                sources=data["sources"].tolist()
+                destinations=data["destinations"].tolist()
+                locations=data["locations"].tolist()
+        except (OSError,ValueError,KeyError,EOFError,zipfile.BadZipFile):
+            return
+        for k,(s,d) in enumerate(zip(sources,destinations)):
+            if (s,d) not in self._paths:
+                self._paths[(s,d)]=nodes[offsets[k]:offsets[k+1]] if offsets[k+1]>offsets[k] else None
+        self.locations.update(locations)
@@ -0,0 +1,35 @@
+"""
+Validation of the single precision fields of the CoDiSS model.
+compare_field_dtypes runs the same simulation from the same seeds with np.float64 and with a reduced
+precision field_dtype (e.g. np.float32) and compares the output probability matrices, so that the
+error can be checked for a layout and a simulation length before the reduced precision is used.
+"""
+import random
+import numpy as np
+
+
+def compare_field_dtypes(make_model,end_date,seed=0,dtype=np.float32,tolerance=1e-5,interventions=None):
+    '''
+    runs the model returned by make_model(field_dtype) until end_date with np.float64 and with dtype,
+    after seeding the random and numpy.random global states with seed, and returns a dictionary with
+    the largest absolute difference of each output matrix, whether the daily infection reports are the
+    same, and "passed" if the largest difference of the probability matrices is at most tolerance
+    make_model:
+        a function that builds a model with the given field_dtype and adds its agents
+    '''
+    results={}
+    for field_dtype in (np.float64,dtype):
+        random.seed(seed)
+        np.random.seed(seed)
+        model=make_model(field_dtype)
+        model.myrun(end_date,interventions)
+        results[field_dtype]={"effective_p_matrix":model.effective_infection_probability_matrix().astype(np.float64),
+                                "p_matrix":model.infection_probability_matrix().astype(np.float64),
+                                "expected_number_matrix":model.infection_matrix.astype(np.float64),
+                                "daily_infection_reports":[dict(r) for r in model.daily_infection_reports]}
+    reference,reduced=results[np.float64],results[dtype]
+    comparison={name:float(np.abs(reference[name]-reduced[name]).max())
+                  for name in ("effective_p_matrix","p_matrix","expected_number_matrix")}
+    comparison["same_infections"]=reference["daily_infection_reports"]==reduced["daily_infection_reports"]
+    comparison["passed"]=max(comparison["effective_p_matrix"],comparison["p_matrix"])<=tolerance
+    return comparison
@@ -0,0 +1,90 @@
+"""
+Per-phase profiler of the CoDiSS model (CovidModel(profile=True)).
+PhaseProfiler adds up the time and the calls of each phase of the time steps (calendar, daily
+processing, quanta decay and spread, gatherings, agent steps, idle skips, path precomputation) and
+the hits and searches of the path table. At the end of each myrun a report is added to reports and
+printed by the model; dump saves the reports as JSON.
+"""
+import json
+import time
+
+#phases that run inside another phase, their time is part of the time of the parent
+PARENTS={"emit_quanta":"agent_step","inhaling":"agent_step"}
+
+
+class PhaseProfiler():
+    def __init__(self):
+        '''
+        cumulative timers and call counters of the phases of the runs of a model
+        '''
+        self.times={}
+        self.calls={}
+        self.reports=[] #one report for each run
+        self._paths=None
+        self._start=None
+
+    clock=staticmethod(time.perf_counter)
+
+    def add(self,phase,start):
+        '''
+        adds the time since start (a value of clock()) to the phase and returns the current clock
+        '''
+        now=time.perf_counter()
+        self.times[phase]=self.times.get(phase,0.0)+now-start
+        self.calls[phase]=self.calls.get(phase,0)+1
+        return now
+
+    def start_run(self,paths):
+        '''
+        clears the timers at the start of a run, paths is the path table of the model
+        '''
+        self.times={}
+        self.calls={}
+        self._paths=(paths,paths.hits,paths.searches,paths.search_time)
+        self._start=time.perf_counter()
+
+    def end_run(self,**info):
+        '''
+        returns the report of the run and adds it to the reports; info is added to the report (e.g. the dates of the run)
+        '''
+        total=time.perf_counter()-self._start
+        phases={}
+        for phase in self.times:
+            phases[phase]={"time":self.times[phase],"calls":self.calls[phase],
+                             "share":self.times[phase]/total if total>0 else 0.0}
+            if phase in PARENTS:
+                phases[phase]["parent"]=PARENTS[phase]
+        accounted=sum(self.times[p] for p in self.times if p not in PARENTS)
+        paths,hits,searches,search_time=self._paths
+        report=dict(info,total=total,phases=phases,other=total-accounted,
+                      paths={"hits":paths.hits-hits,"searches":paths.searches-searches,
+                             "search_time":paths.search_time-search_time})
+        self.reports.append(report)
+        return report
+
+    def dump(self,file_name):
+        '''
+        saves the reports of all the runs in a JSON file
+        '''
+        with open(file_name,"w") as f:
+            json.dump(self.reports,f,indent=1,default=str)
+
+
+def format_report(report):
+    '''
+    returns the report of a run as a text table, the phases sorted by their time
+    '''
+    lines=["%-16s %10s %10s %7s"%("phase","seconds","calls","share")]
+    phases=sorted(report["phases"].items(),key=lambda x:-x[1]["time"])
+    for phase,p in phases:
+        if "parent" in p:
+            continue
+        lines.append("%-16s %10.3f %10d %6.1f%%"%(phase,p["time"],p["calls"],100*p["share"]))
+        for child,c in phases:
+            if c.get("parent")==phase:
+                lines.append("  %-14s %10.3f %10d %6.1f%%"%(child,c["time"],c["calls"],100*c["share"]))
+    lines.append("%-16s %10.3f"%("other",report["other"]))
+    lines.append("%-16s %10.3f"%("total",report["total"]))
+    paths=report["paths"]
+    lines.append("paths: %d cache hits, %d Dijkstra searches (%.3f s)"%(paths["hits"],paths["searches"],paths["search_time"]))
+    return "\n".join(lines)
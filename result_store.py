@@ -0,0 +1,96 @@
+"""
+A resumable store of the results of the Monte Carlo simulation runs.
+Each run is saved in its own .npz shard as soon as it finishes, and manifest.json lists the complete
+runs with the settings of the simulation. The shards and the manifest are written to a temporary
+file and renamed, so a shard missing from the manifest is ignored and its run is repeated.
+mcs_runner.run_mcs loads the saved runs instead of running them again.
+"""
+import json
+import os
+import numpy as np
+
+MANIFEST="manifest.json"
+STORE_VERSION=1
+MATRICES=("effective_p_matrix","p_matrix","expected_number_matrix")
+
+
+class ResultStore():
+    def __init__(self,directory,settings=None):
+        '''
+        directory:
+            directory of the shards and the manifest, it is created if it does not exist
+        settings:
+            a json serializable dictionary of the settings of the simulation (e.g. the scenario ID and
+            the base seed); resuming a simulation saved with different settings raises a ValueError
+        '''
+        self.directory=directory
+        self.settings=settings or {}
+        self.completed=set()
+        os.makedirs(directory,exist_ok=True)
+        path=os.path.join(directory,MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest=json.load(f)
+            if manifest.get("version")!=STORE_VERSION:
+                raise ValueError("the result store in "+directory+" was saved by another version")
+            if manifest.get("settings",{})!=json.loads(json.dumps(self.settings)):
+                raise ValueError("the result store in "+directory+" was saved with other settings: "
+                                 +str(manifest.get("settings")))
+            self.completed=set(manifest["completed"])
+
+    def __contains__(self,index):
+        return index in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def shard_name(self,index):
+        return os.path.join(self.directory,"replicate_%05d.npz"%index)
+
+    def _write_manifest(self):
+        path=os.path.join(self.directory,MANIFEST)
+        with open(path+".tmp","w") as f:
+            json.dump({"version":STORE_VERSION,"settings":self.settings,
+                       "completed":sorted(self.completed)},f)
+        os.replace(path+".tmp",path)
+
+    def save(self,index,results):
+        '''
+        saves the results of run number index, as returned by mcs_runner.model_results
+        (or a list of them for a batch of replicates), and adds the run to the manifest
+        '''
+        batch=results if isinstance(results,list) else [results]
+        arrays={"batched":np.array(isinstance(results,list)),"count":np.array(len(batch))}
+        for k,r in enumerate(batch):
+            prefix=str(k)+"_"
+            for name in MATRICES:
+                arrays[prefix+name]=np.asarray(r[name])
+            report=r["daily_infection_report"]
+            arrays[prefix+"report_dates"]=np.array(list(report),dtype="datetime64[D]")
+            arrays[prefix+"report_numbers"]=np.array(list(report.values()),dtype=np.int64)
+            arrays[prefix+"attack_rate"]=np.array(r["attack_rate"],dtype=np.float64)
+            arrays[prefix+"infected_dates"]=np.array(r["infected_dates"],dtype="datetime64[D]")
+            arrays[prefix+"infected_number"]=np.asarray(r["infected_number"])
+        path=self.shard_name(index)
+        with open(path+".tmp","wb") as f:
+            np.savez(f,**arrays)
+        os.replace(path+".tmp",path)
+        self.completed.add(index)
+        self._write_manifest()
+
+    def load(self,index):
+        '''
+        returns the results of run number index in the form they were saved
+        '''
+        with np.load(self.shard_name(index)) as data:
+            batch=[]
+            for k in range(int(data["count"])):
+                prefix=str(k)+"_"
+                r={name:data[prefix+name] for name in MATRICES}
+                r["daily_infection_report"]=dict(zip(data[prefix+"report_dates"].astype(object).tolist(),
+                                                       data[prefix+"report_numbers"].tolist()))
+                r["attack_rate"]=float(data[prefix+"attack_rate"])
+                r["infected_dates"]=data[prefix+"infected_dates"].astype(object).tolist()
+                r["infected_number"]=data[prefix+"infected_number"]
+                batch.append(r)
+            return batch if bool(data["batched"]) else batch[0]
@@ -0,0 +1,156 @@
+"""
+A scheduler for the Monte Carlo simulations of many scenarios.
+run_sweep runs the replicates of all the scenario specs (e.g. a factorial design of expand_grid) as
+scenario x replicate jobs on one process pool. The scenarios with identical layouts run one after
+another, so each process reuses their compiled layout and path table; replicate i of every scenario has the
+seed of replicate i of mcs_runner.run_mcs. The results of each scenario are reduced in the order of
+its runs, can be saved in a ResultStore per scenario, and stop with a stop rule.
+"""
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor,as_completed
+from create_senarios import compile_layout,compile_scenario,plot_scenario
+from mcs_runner import replicate_seed,MCSResults,_reduce
+from result_store import ResultStore
+from paths import layout_key
+
+_contexts={} #spec -> context of the specs of the layout being run, in each process
+_layout=None #(make_context, layout group) of the contexts
+
+
+def layout_group(s):
+    '''
+    returns the transforms of a spec, the specs with the same transforms have the same layout and locations
+    '''
+    return tuple(s.get("transforms",()))
+
+
+def _context(make_context,s):
+    global _layout
+    group=(make_context,layout_group(s))
+    if group!=_layout:
+        #the jobs are ordered by layout, the contexts of the previous layout are not used again
+        _contexts.clear()
+        _layout=group
+    key=repr(s)
+    if key not in _contexts:
+        _contexts[key]=make_context(s)
+    return _contexts[key]
+
+
+def _run_job(run_replicate,make_context,s,index,seed):
+    context=_context(make_context,s)
+    random.seed(seed)
+    np.random.seed(seed)
+    return s["name"],index,run_replicate(index,seed,context)
+
+
+def schedule(specs,replicates):
+    '''
+    returns the (spec, replicate number) jobs of the sweep, the scenarios with identical
+    layouts are grouped together and keep the order in which their first layout appears;
+    only the layout of each list of transforms is compiled
+    '''
+    keys={} #layout group -> layout key
+    groups={} #layout key -> specs
+    for s in specs:
+        group=layout_group(s)
+        if group not in keys:
+            keys[group]=layout_key(compile_layout(group)[0])
+        groups.setdefault(keys[group],[]).append(s)
+    return [(s,i) for group in groups.values() for s in group for i in range(replicates)]
+
+
+def run_sweep(run_replicate,specs,replicates,base_seed=0,workers=None,make_context=compile_scenario,
+              reducer=MCSResults,store_settings=None,plot=False,stop=None):
+    '''
+    runs the replicates of all the scenarios and returns a dictionary with the reducer of each scenario
+    run_replicate:
+        a module level function run_replicate(index, seed, context) as in mcs_runner.run_mcs
+    specs:
+        the scenario specs, with unique names
+    make_context:
+        a module level function that returns the context of a spec (e.g. its compiled scenario)
+    reducer:
+        called without arguments to create the reducer of each scenario
+    store_settings:
+        if not None, the results of each scenario are saved in a ResultStore in the "replicates"
+        directory of the scenario (its file_loc), with these settings, the spec and the base seed;
+        the replicates found in the stores are not run again
+    plot:
+        render the layout figures of the scenarios after the runs
+    stop:
+        a function stop(reducer) called after each replicate of a scenario is reduced, the scenario
+        stops when it returns True
+    workers:
+        number of processes (None for the number of cores); 1 runs the jobs in this process
+    '''
+    names=[s["name"] for s in specs]
+    if len(set(names))!=len(names):
+        raise ValueError("the names of the scenarios should be unique")
+    seeds=[replicate_seed(base_seed,i) for i in range(replicates)]
+    reducers={name:reducer() for name in names}
+    stores={}
+    if store_settings is not None:
+        for s in specs:
+            settings=dict(store_settings,scenario=s,base_seed=base_seed)
+            stores[s["name"]]=ResultStore(os.path.join(_context(make_context,s)["file_loc"],"replicates"),settings)
+    jobs=[(s,i) for s,i in schedule(specs,replicates)
+            if s["name"] not in stores or i not in stores[s["name"]]]
+
+    pending={name:{} for name in names}
+    next_index={name:0 for name in names}
+    stopped=set()
+    futures={name:[] for name in names}
+
+    def reduce_ready(name):
+        store=stores.get(name)
+        while next_index[name]<replicates and name not in stopped:
+            i=next_index[name]
+            if i in pending[name]:
+                _reduce(reducers[name],pending[name].pop(i))
+            elif store is not None and i in store:
+                _reduce(reducers[name],store.load(i))
+            else:
+                break
+            next_index[name]+=1
+            if stop is not None and stop(reducers[name]):
+                stopped.add(name)
+                for f in futures[name]:
+                    f.cancel()
+
+    def finished(name,index,results):
+        if name in stopped:
+            return
+        if name in stores:
+            stores[name].save(index,results)
+        pending[name][index]=results
+        reduce_ready(name)
+
+    for name in names:
+        reduce_ready(name)
+    error=None
+    if workers==1:
+        for s,i in jobs:
+            if s["name"] not in stopped:
+                finished(*_run_job(run_replicate,make_context,s,i,seeds[i]))
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for s,i in jobs:
+                if s["name"] not in stopped:
+                    futures[s["name"]].append(executor.submit(_run_job,run_replicate,make_context,s,i,seeds[i]))
+            for future in as_completed([f for name in names for f in futures[name]]):
+                if future.cancelled():
+                    continue
+                try:
+                    finished(*future.result())
+                except Exception as ex:
+                    #keep saving the jobs that finish, the error is raised at the end
+                    error=error or ex
+    if error is not None:
+        raise error
+    if plot:
+        for s in specs:
+            plot_scenario(compile_scenario(s))
+    return reducers
@@ -0,0 +1,33 @@
+import datetime
+import numpy as np
+import layout
+
+START=datetime.datetime(2020,2,24,8,0) #a Monday
+
+
+def crews(number,seed=0):
+    '''
+    returns the crews of number agents at the desks of the case study layout for CovidModel.add_crew,
+    with the tasks of case_study_MCS.py; the first agent is infected
+    '''
+    rng=np.random.default_rng(seed)
+    locations=layout.define_locations()
+    desks=np.concatenate([np.array(d,dtype=np.int64) for d in locations["desk"]],axis=1)
+    places={name:np.concatenate([np.array(p,dtype=np.int64) for p in locations[name]],axis=1)
+            for name in ("elevator","coffee","washroom")}
+
+    def pick(cells):
+        k=rng.integers(cells.shape[1])
+        return (int(cells[0,k]),int(cells[1,k]))
+
+    result=[]
+    for n,k in enumerate(rng.choice(desks.shape[1],number,replace=False)):
+        task_ps=np.array([rng.uniform(86,93),rng.uniform(3,6),rng.uniform(3,6),rng.uniform(1,2)])
+        task_ps=task_ps/task_ps.sum()
+        start=datetime.timedelta(hours=8,minutes=30+int(rng.integers(0,30)))
+        result.append({"crew size":1,"speed":60,"infected":n==0,"marker":"o",
+                       "tasks":[[pick(places["elevator"]),3,0],[(int(desks[0,k]),int(desks[1,k])),5,task_ps[0]],
+                                [pick(places["coffee"]),5,task_ps[1]],[pick(desks),5,task_ps[2]],
+                                [pick(places["washroom"]),5,task_ps[3]]],
+                       "shift":[start,datetime.timedelta(hours=8)]})
+    return result
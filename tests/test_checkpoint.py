@@ -0,0 +1,72 @@
+import contextlib
+import datetime
+import io
+import random
+import numpy as np
+import pytest
+import scipy.stats as st
+import CoDiSS
+import layout
+import office
+
+START=office.START
+MIDDLE=START+datetime.timedelta(hours=5)
+END=START+datetime.timedelta(days=2)
+
+
+def build(engine):
+    layout_1=layout.create_layout()
+    return CoDiSS.CovidModel(layout=layout_1,start_date=START,ventilation_efficiency=np.full(layout_1.shape,.3),
+                             infection_rate=[0.0,0],workhours_per_day=9.5,interventions={"isolation":st.uniform(0,3)},
+                             time_step=60,workdays=5,seed=3,engine=engine)
+
+
+def add_agents(model):
+    for crew in office.crews(40):
+        agents=model.add_crew(crew)
+        if crew["infected"]:
+            agents[0].get_infected(START)
+
+
+def run(model,end):
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.myrun(end)
+
+
+def assert_same_results(a,b):
+    assert np.array_equal(a.quanta_matrix,b.quanta_matrix)
+    assert np.array_equal(a.infection_matrix,b.infection_matrix)
+    assert np.array_equal(a.total_inhaled_matrix,b.total_inhaled_matrix)
+    assert a.daily_infection_report==b.daily_infection_report
+
+
+@pytest.mark.parametrize("engine",["agents","array"])
+def test_restored_model_continues_with_the_same_results(engine,tmp_path):
+    random.seed(0)
+    np.random.seed(0)
+    model=build(engine)
+    add_agents(model)
+    run(model,MIDDLE)
+    model.save_checkpoint(str(tmp_path/"checkpoint")) #the .npz extension is added
+    run(model,END)
+    restored=build(engine)
+    restored.load_checkpoint(str(tmp_path/"checkpoint"))
+    run(restored,END)
+    assert_same_results(model,restored)
+    assert model.infection_matrix.sum()>0
+
+
+@pytest.mark.parametrize("engine",["agents","array"])
+def test_forks_continue_with_the_same_results(engine):
+    random.seed(0)
+    np.random.seed(0)
+    model=build(engine)
+    add_agents(model)
+    run(model,MIDDLE)
+    branches=model.fork(2)
+    for m in [model]+branches:
+        random.seed(1)
+        np.random.seed(1)
+        run(m,END)
+    assert_same_results(model,branches[0])
+    assert_same_results(model,branches[1])
@@ -0,0 +1,82 @@
+import contextlib
+import datetime
+import io
+import random
+import numpy as np
+import pytest
+import scipy.stats as st
+import CoDiSS
+import event_log
+import layout
+import office
+
+START=office.START
+END=START+datetime.timedelta(days=5) #the infections of the second day emit from the third day on
+
+
+def build(engine,interventions=None,common_random_numbers=True):
+    random.seed(0)
+    np.random.seed(0)
+    layout_1=layout.create_layout()
+    model=CoDiSS.CovidModel(layout=layout_1,start_date=START,ventilation_efficiency=np.full(layout_1.shape,.3),
+                            infection_rate=[0.0,0],workhours_per_day=9.5,
+                            interventions=interventions or {"isolation":st.uniform(0,3)},
+                            time_step=60,workdays=5,seed=0,engine=engine,common_random_numbers=common_random_numbers)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for crew in office.crews(80):
+            agents=model.add_crew(crew)
+            if crew["infected"]:
+                agents[0].get_infected(START)
+    return model
+
+
+def run(model,end=END):
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.myrun(end)
+    return model
+
+
+def assert_same_results(a,b):
+    assert np.array_equal(a.quanta_matrix,b.quanta_matrix)
+    assert np.array_equal(a.total_quanta,b.total_quanta)
+    assert np.array_equal(a.infection_matrix,b.infection_matrix)
+    assert np.array_equal(a.total_inhaled_matrix,b.total_inhaled_matrix)
+    assert a.daily_infection_report==b.daily_infection_report
+    assert np.array_equal(a.events.events(),b.events.events())
+
+
+def test_engines_apply_the_same_rules(monkeypatch):
+    #the engines draw their values in another order without common random numbers, constant draws compare their rules
+    monkeypatch.setattr(random,"random",lambda:.5)
+    monkeypatch.setattr(random,"uniform",lambda a,b:(a+b)/2)
+    models=[build(engine,common_random_numbers=False) for engine in ("agents","array")]
+    for model in models:
+        model.agents[-1].get_infected(START) #emits after the agents that share its cell
+        monkeypatch.setattr(model.variates,"rvs",lambda key,size=None:.5 if size is None else np.full(size,.5))
+    agents,array=[run(model) for model in models]
+    assert agents.total_inhaled_matrix.sum()>0
+    assert_same_results(agents,array)
+
+
+def test_array_engine_matches_the_agents_engine():
+    agents=run(build("agents"))
+    assert sum(agents.daily_infection_report.values())>1 #the new infected agents emit too
+    assert_same_results(agents,run(build("array")))
+
+
+def test_test_intervention_on_both_engines():
+    interventions={"isolation":st.uniform(0,3),"test":[2,100,3]}
+    agents=run(build("agents",interventions))
+    array=run(build("array",interventions))
+    assert (agents.events.events()["event"]==event_log.TEST_ISOLATION).any()
+    assert_same_results(agents,array)
+
+
+@pytest.mark.parametrize("engine",["agents","array"])
+def test_shift_events_match_a_scan_of_all_agents(engine):
+    queued=run(build(engine))
+    scanned=build(engine)
+    calendar=scanned.get_calendar()
+    #all the agents are checked in each time step
+    calendar.due=lambda tick:(np.arange(calendar.n),calendar.in_shift(tick))
+    assert_same_results(queued,run(scanned))
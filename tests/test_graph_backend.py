@@ -0,0 +1,60 @@
+import datetime
+import numpy as np
+import networkx as nx
+import ABS
+import layout
+from paths import PathService
+
+START=datetime.datetime(2020,2,24,8,0)
+
+
+def make_graphs():
+    layout_1=layout.add_33_zones(layout.create_layout())
+    return layout_1,ABS.model(layout_1,START,60,graph_backend="csr").graph,ABS.model(layout_1,START,60,graph_backend="networkx").graph
+
+
+def length(graph,path):
+    return sum(graph[a][b]["weight"] for a,b in zip(path[:-1],path[1:]))
+
+
+def test_csr_graph_has_the_networkx_edges():
+    layout,csr,networkx=make_graphs()
+    g,h=csr.to_networkx(),networkx.to_networkx()
+    assert set(g.nodes)==set(h.nodes)
+    assert {frozenset(e) for e in g.edges}=={frozenset(e) for e in h.edges}
+    for a,b in h.edges:
+        assert g[a][b]["weight"]==h[a][b]["weight"]
+
+
+def test_csr_and_networkx_paths_have_the_same_length():
+    layout,csr,networkx=make_graphs()
+    g=networkx.to_networkx()
+    nodes=sorted(max(nx.connected_components(g),key=len))
+    rng=np.random.default_rng(0)
+    for a,b in rng.choice(nodes,(50,2)).tolist():
+        p,q=csr.shortest_path(a,b),networkx.shortest_path(a,b)
+        assert p[0]==a and p[-1]==b
+        assert all(g.has_edge(u,v) for u,v in zip(p[:-1],p[1:]))
+        assert abs(length(g,p)-length(g,q))<1e-9
+
+
+def test_path_service_gives_shortest_paths_with_both_backends():
+    layout,csr,networkx=make_graphs()
+    g=networkx.to_networkx()
+    nodes=sorted(max(nx.connected_components(g),key=len))
+    rng=np.random.default_rng(1)
+    tasks=rng.choice(nodes,12).tolist()
+    for graph in (csr,networkx):
+        service=PathService(graph,layout)
+        service.add_routes(tasks[:6])
+        service.add_routes(tasks[4:])
+        service.precompute()
+        searches=service.searches
+        for a in tasks[:6]:
+            for b in tasks[:6]:
+                p=service.path(a,b).tolist()
+                assert p[0]==a and p[-1]==b
+                assert abs(length(g,p)-nx.dijkstra_path_length(g,a,b))<1e-9
+        assert service.searches==searches #the routes are answered from the table
+        a,b=rng.choice(nodes,2).tolist()
+        assert abs(length(g,service.path(a,b).tolist())-nx.dijkstra_path_length(g,a,b))<1e-9
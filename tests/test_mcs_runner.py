@@ -0,0 +1,67 @@
+import datetime
+import os
+import random
+import time
+import numpy as np
+from mcs_runner import run_mcs, TargetPrecision
+
+
+def run_replicate(index,seed,context):
+    #results in the form of mcs_runner.model_results, drawn from the global states seeded by run_mcs
+    rate=random.uniform(0,100)
+    day=datetime.date(2020,2,24)+datetime.timedelta(days=index%3)
+    return {"effective_p_matrix":np.random.random((4,5)),
+            "p_matrix":np.random.random((4,5)),
+            "expected_number_matrix":np.random.random((4,5)),
+            "daily_infection_report":{day:int(np.random.randint(5))},
+            "attack_rate":rate,
+            "infected_dates":[day],
+            "infected_number":np.array([index])}
+
+
+def directory(path):
+    return path
+
+
+def blocked_replicate(index,seed,context):
+    #the replicates from 3 on wait until the test creates the release file
+    if index>=3:
+        waited=0
+        while not os.path.exists(os.path.join(context,"release")) and waited<600:
+            time.sleep(.05)
+            waited+=1
+        open(os.path.join(context,"finished_%d"%index),"w").close()
+    return run_replicate(index,seed,context)
+
+
+def assert_same_reductions(a,b):
+    assert a.replicates==b.replicates
+    for x,y in zip(a.mean_matrices(),b.mean_matrices()):
+        assert np.array_equal(x,y)
+    assert a.attack_rates==b.attack_rates
+    assert a.daily_infection_report==b.daily_infection_report
+    assert [n.tolist() for n in a.infected_number]==[n.tolist() for n in b.infected_number]
+
+
+def test_results_do_not_depend_on_the_workers():
+    serial=run_mcs(run_replicate,8,base_seed=5,workers=1)
+    parallel=run_mcs(run_replicate,8,base_seed=5,workers=2)
+    assert serial.replicates==8
+    assert_same_reductions(serial,parallel)
+
+
+def test_stop_rule_uses_the_same_replicates_for_any_workers():
+    stop=TargetPrecision("attack_rates",half_width=25,min_replicates=3)
+    serial=run_mcs(run_replicate,40,base_seed=5,workers=1,stop=stop)
+    parallel=run_mcs(run_replicate,40,base_seed=5,workers=2,stop=stop)
+    assert serial.replicates<40
+    assert_same_reductions(serial,parallel)
+
+
+def test_stop_rule_does_not_wait_for_running_replicates(tmp_path):
+    results=run_mcs(blocked_replicate,6,base_seed=5,workers=2,initializer=directory,initargs=(str(tmp_path),),
+                    stop=TargetPrecision("attack_rates",half_width=1000,min_replicates=3))
+    finished=[name for name in os.listdir(tmp_path) if name.startswith("finished")]
+    open(tmp_path/"release","w").close() #lets the running replicates finish
+    assert results.replicates==3
+    assert finished==[]
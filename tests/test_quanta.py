@@ -0,0 +1,92 @@
+import contextlib
+import datetime
+import io
+import random
+import numpy as np
+import pytest
+import scipy.stats as st
+import CoDiSS
+import layout
+import office
+import precision
+
+START=office.START
+
+
+def build(agents=0,**settings):
+    layout_1=layout.create_layout()
+    model=CoDiSS.CovidModel(layout=layout_1,start_date=START,ventilation_efficiency=np.full(layout_1.shape,.3),
+                            infection_rate=[0.0,0],workhours_per_day=9.5,interventions={"isolation":st.uniform(0,3)},
+                            time_step=60,workdays=5,seed=3,**settings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for crew in office.crews(agents):
+            added=model.add_crew(crew)
+            if crew["infected"]:
+                added[0].get_infected(START)
+    return model
+
+
+def reference_steps(model,steps):
+    #the decay and spread of the whole layout, channel by channel
+    total=model.total_quanta.copy()
+    for _ in range(steps):
+        model.Decay()
+        model.quanta_spread()
+        total+=np.sum(model.quanta_matrix,axis=2)
+    return model.quanta_matrix,total
+
+
+@pytest.mark.parametrize("block_rows",[None,7])
+def test_fused_stencil_matches_decay_and_spread(block_rows):
+    model=build()
+    if block_rows is not None:
+        model._spread_block_rows=block_rows
+    model.quanta_matrix[:]=np.random.default_rng(0).random(model.quanta_matrix.shape)
+    field=model.quanta_matrix.copy()
+    model._active_region=[0,model.site_width,0,model.site_height]
+    for _ in range(3):
+        model.advance_quanta()
+    reference=build()
+    reference.quanta_matrix[:]=field
+    quanta,total=reference_steps(reference,3)
+    assert np.array_equal(model.quanta_matrix,quanta)
+    assert np.array_equal(model.total_quanta,total)
+
+
+def test_active_region_matches_the_full_grid():
+    model=build()
+    model.quanta_matrix[10:13,12:14]=np.random.default_rng(0).random((3,2,4))
+    field=model.quanta_matrix.copy()
+    model.add_to_active_region([10,12],[12,13])
+    for _ in range(5):
+        model.advance_quanta()
+    assert model._active_region!=[0,model.site_width,0,model.site_height]
+    reference=build()
+    reference.quanta_matrix[:]=field
+    quanta,total=reference_steps(reference,5)
+    assert np.array_equal(model.quanta_matrix,quanta)
+    assert np.array_equal(model.total_quanta,total)
+
+
+def test_skipped_idle_steps_give_the_same_results():
+    end=START+datetime.timedelta(days=2)
+    results=[]
+    for skip_idle in (True,False):
+        random.seed(0)
+        np.random.seed(0)
+        model=build(40)
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.myrun(end,skip_idle=skip_idle)
+        results.append(model)
+    skipped,stepped=results
+    assert np.array_equal(skipped.total_quanta,stepped.total_quanta)
+    assert np.array_equal(skipped.infection_matrix,stepped.infection_matrix)
+    assert skipped.daily_infection_report==stepped.daily_infection_report
+
+
+def test_single_precision_fields_within_tolerance():
+    with contextlib.redirect_stdout(io.StringIO()):
+        comparison=precision.compare_field_dtypes(lambda field_dtype:build(40,field_dtype=field_dtype),
+                                                  START+datetime.timedelta(days=2),tolerance=1e-5)
+    assert comparison["passed"]
+    assert comparison["same_infections"]
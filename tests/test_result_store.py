@@ -0,0 +1,28 @@
+from mcs_runner import run_mcs
+from result_store import ResultStore
+from test_mcs_runner import run_replicate, assert_same_reductions
+
+runs=[] #replicates run by counted_replicate
+
+
+def counted_replicate(index,seed,context):
+    runs.append(index)
+    return run_replicate(index,seed,context)
+
+
+def test_resume_after_a_partial_manifest(tmp_path):
+    complete=run_mcs(run_replicate,6,base_seed=5,workers=1)
+    store=ResultStore(str(tmp_path),{"scenario":"test"})
+    run_mcs(run_replicate,3,base_seed=5,workers=1,store=store)
+    #a shard saved without its manifest entry, as if the process stopped between the two writes
+    store.save(4,run_replicate(4,0,None))
+    store.completed.discard(4)
+    store._write_manifest()
+
+    resumed=ResultStore(str(tmp_path),{"scenario":"test"})
+    assert sorted(resumed.completed)==[0,1,2]
+    del runs[:]
+    results=run_mcs(counted_replicate,6,base_seed=5,workers=1,store=resumed)
+    assert runs==[3,4,5]
+    assert sorted(resumed.completed)==list(range(6))
+    assert_same_reductions(complete,results)
@@ -0,0 +1,32 @@
+import sweep
+from create_senarios import spec, meetings
+from sweep import run_sweep, schedule
+from test_mcs_runner import run_replicate, assert_same_reductions
+
+contexts=[] #specs compiled by counted_context
+
+
+def counted_context(s):
+    contexts.append(s["name"])
+    return {"name":s["name"]}
+
+
+SPECS=[spec("a"),spec("b",transforms=["add_1_zone"]),spec("c",gatherings=meetings(duration=30)),
+       spec("d",transforms=["add_1_coffee_area"])]
+
+
+def test_schedule_groups_the_scenarios_of_the_same_layout():
+    jobs=schedule(SPECS,2)
+    #the coffee areas only change the locations, so d has the layout of a and c
+    assert [(s["name"],i) for s,i in jobs]==[("a",0),("a",1),("c",0),("c",1),("d",0),("d",1),("b",0),("b",1)]
+
+
+def test_contexts_are_compiled_once_for_each_scenario():
+    del contexts[:]
+    sweep._contexts.clear()
+    serial=run_sweep(run_replicate,SPECS,3,base_seed=5,workers=1,make_context=counted_context)
+    assert sorted(contexts)==["a","b","c","d"]
+    parallel=run_sweep(run_replicate,SPECS,3,base_seed=5,workers=2,make_context=counted_context)
+    for s in SPECS:
+        assert serial[s["name"]].replicates==3
+        assert_same_reductions(serial[s["name"]],parallel[s["name"]])
@@ -0,0 +1,153 @@
+"""
+Pools of pre-drawn random variates for the CoDiSS model.
+The VariatePool draws the values of each registered distribution in blocks and serves them one at
+a time or as vectors, instead of calling .rvs() for every value. With streams=True (common random
+numbers), each distribution and each purpose of the model has its own stream derived from the seed
+and the name of the stream, so two scenarios run with the same seed use the same random numbers for
+the same purposes.
+"""
+import random
+import zlib
+import numpy as np
+
+
+def stream_seed(seed,*names):
+    '''
+    returns the seed of the stream identified by the names (strings or integers) for a base seed
+    '''
+    key=[zlib.crc32(repr(n).encode()) if not isinstance(n,(int,np.integer)) else int(n) for n in names]
+    return int(np.random.SeedSequence([int(seed)]+key).generate_state(1)[0])
+
+
+def _key(name):
+    # the names of the streams saved as json lists are tuples
+    return tuple(_key(n) for n in name) if isinstance(name,list) else name
+
+
+class VariatePool():
+    def __init__(self,seed=None,block_size=4096,streams=False):
+        '''
+        seed:
+            seed of the numpy Generator used to draw all the blocks (None for a random seed)
+        block_size:
+            number of values drawn at once for each distribution
+        streams:
+            draw each distribution and each purpose from its own stream (common random numbers)
+        '''
+        self.block_size=block_size
+        self.streams=streams
+        self.reseed(seed)
+        self._distributions={}
+        self._blocks={}
+        self._cursors={}
+        self._aliases={} #key -> key of the block it shares
+
+    def register(self,key,distribution,shared=None):
+        '''
+        registers a frozen scipy.stats distribution under the given key,
+        the key can be any hashable object such as "ci" or ("IR", 1);
+        shared is the key of a distribution whose values are used for this key when the pool has
+        no streams (e.g. "task" and "mask" use the values of "uniform")
+        '''
+        if shared is not None and not self.streams:
+            self._aliases[key]=shared
+            return
+        self._distributions[key]=distribution
+        self._blocks[key]=np.empty(0)
+        self._cursors[key]=0
+        if self.streams:
+            self._rngs[key]=np.random.default_rng(stream_seed(self.seed,"variates",key))
+
+    def __contains__(self,key):
+        return key in self._distributions or key in self._aliases
+
+    def _refill(self,key,size):
+        # draw at least one block, keep the values that are not used yet
+        remaining=self._blocks[key][self._cursors[key]:]
+        n=max(self.block_size,size-len(remaining))
+        rng=self._rngs[key] if self.streams else self.rng
+        new_block=self._distributions[key].rvs(size=n,random_state=rng)
+        self._blocks[key]=np.concatenate((remaining,np.atleast_1d(new_block)))
+        self._cursors[key]=0
+
+    def rvs(self,key,size=None):
+        '''
+        returns a single value (size=None) or a numpy array with size values
+        drawn from the distribution registered under key
+        '''
+        key=self._aliases.get(key,key)
+        n=1 if size is None else size
+        cursor=self._cursors[key]
+        if cursor+n>len(self._blocks[key]):
+            self._refill(key,n)
+            cursor=0
+        self._cursors[key]=cursor+n
+        if size is None:
+            return self._blocks[key][cursor]
+        return self._blocks[key][cursor:cursor+n]
+
+    def stream(self,name):
+        '''
+        returns the random.Random of a purpose of the model, or the random module without streams
+        '''
+        if not self.streams:
+            return random
+        if name not in self._streams:
+            self._streams[name]=random.Random(stream_seed(self.seed,"random",name))
+        return self._streams[name]
+
+    def generator(self,name):
+        '''
+        returns the numpy Generator of a purpose of the model (e.g. for the random_state of the
+        .rvs() of a distribution), or None (the numpy.random global state) without streams
+        '''
+        if not self.streams:
+            return None
+        if name not in self._generators:
+            self._generators[name]=np.random.default_rng(stream_seed(self.seed,"numpy",name))
+        return self._generators[name]
+
+    def reseed(self,seed):
+        '''
+        starts new streams for all the distributions from seed, the values drawn before are discarded
+        '''
+        if self.streams and seed is None:
+            seed=np.random.SeedSequence().entropy%2**63
+        self.seed=seed
+        self.rng=np.random.default_rng(seed)
+        self._rngs={}
+        self._streams={}
+        self._generators={}
+        for key in getattr(self,"_distributions",{}):
+            self._blocks[key]=np.empty(0)
+            self._cursors[key]=0
+            if self.streams:
+                self._rngs[key]=np.random.default_rng(stream_seed(self.seed,"variates",key))
+
+    def get_state(self):
+        '''
+        returns the state of the pool (the state of the Generators, of the streams and the unused values
+        of the blocks), the keys are listed in the order in which they were registered
+        '''
+        keys=list(self._distributions)
+        return {"keys":keys,"rng":self.rng.bit_generator.state,
+                "blocks":[self._blocks[k] for k in keys],"cursors":[self._cursors[k] for k in keys],
+                "rngs":[self._rngs[k].bit_generator.state for k in keys] if self.streams else None,
+                "streams":[[name,r.getstate()] for name,r in self._streams.items()],
+                "generators":[[name,g.bit_generator.state] for name,g in self._generators.items()]}
+
+    def set_state(self,state):
+        '''
+        restores a state returned by get_state, for a pool with the same registered distributions
+        '''
+        self.rng.bit_generator.state=state["rng"]
+        for k,(key,block,cursor) in enumerate(zip(self._distributions,state["blocks"],state["cursors"])):
+            self._blocks[key]=np.array(block,dtype=np.float64)
+            self._cursors[key]=int(cursor)
+            if state.get("rngs") is not None:
+                self._rngs[key].bit_generator.state=state["rngs"][k]
+        for name,s in state.get("streams",[]):
+            version,internal,gauss=s
+            self.stream(_key(name)).setstate((version,tuple(internal),gauss))
+        for name,s in state.get("generators",[]):
+            self.generator(_key(name)).bit_generator.state=s
@@ -0,0 +1,160 @@
+"""
+The work calendar of the CoDiSS model.
+WorkCalendar precomputes, in seconds from midnight, the working hours of the site, the workdays and
+the shifts of the agents, and answers on the integer clock of the model (tick) whether a time step
+can be skipped. The arrivals and departures of each day are kept in a queue of shift events sorted
+by time, so only the agents whose shift starts or ends are checked in a time step (see due); all
+agents are checked at the start of each day and after the daily processing (see check_all).
+"""
+import math
+import numpy as np
+
+DAY_SECONDS=24*3600
+HALF_DAY_SECONDS=5*3600 #length of the shifts in the half working day
+
+
+class WorkCalendar():
+    def __init__(self,model):
+        '''
+        creates the calendar for the agents of the model,
+        the calendar should be created again if agents are added to the model
+        '''
+        self.n=len(model.agents)
+        self.time_step=model.time_step
+        self.workdays=model.workdays
+        self.start_weekday=model.start_time.weekday()
+        start=model.start_time.time()
+        self.day_start=start.hour*3600+start.minute*60+start.second
+        self.site_end=model.site_workhours[1].seconds
+        self.shift_start=np.array([a.shift[0].total_seconds() for a in model.agents],dtype=np.float64)
+        self.shift_end=np.array([(a.shift[0]+a.shift[1]).total_seconds() for a in model.agents],dtype=np.float64)
+        self.half_day_end=self.shift_start+HALF_DAY_SECONDS
+        #shift events of the current day (see due)
+        self._day=None
+        self._event_times=np.zeros(0)
+        self._event_agents=np.zeros(0,dtype=np.int64)
+        self._next_event=0
+        self._windows=None
+        self._recheck=np.zeros(0,dtype=np.int64)
+
+    @staticmethod
+    def seconds_of_day(tick):
+        return tick%DAY_SECONDS
+
+    def weekday(self,tick):
+        return (self.start_weekday+tick//DAY_SECONDS)%7
+
+    def is_site_closing(self,tick):
+        '''
+        returns true in the first time step after the end of the working hours of the site
+        '''
+        t=tick%DAY_SECONDS
+        t-=t%60
+        return self.site_end+self.time_step>t>=self.site_end
+
+    def is_half_day(self,tick):
+        return self.weekday(tick)==self.workdays
+
+    def shift_windows(self,tick):
+        '''
+        returns the start and end of the shift of all agents in the day of tick,
+        or None if it is not a working day
+        '''
+        weekday=self.weekday(tick)
+        if weekday<self.workdays:
+            return self.shift_start,self.shift_end
+        if weekday==self.workdays:
+            return self.shift_start,self.half_day_end
+        return None
+
+    def in_shift(self,tick):
+        '''
+        returns a boolean array showing the agents whose shift includes tick;
+        in the half working day, the agents in isolation should be excluded by the caller
+        '''
+        windows=self.shift_windows(tick)
+        if windows is None:
+            return np.zeros(self.n,dtype=bool)
+        t=tick%DAY_SECONDS
+        return (windows[0]<=t)&(t<windows[1])
+
+    def _plan_day(self,day):
+        '''
+        sorts the starts and ends of the shifts of the day, the empty shifts have no events
+        '''
+        self._day=day
+        self._windows=self.shift_windows(day*DAY_SECONDS)
+        self._next_event=0
+        if self._windows is None:
+            self._event_times=np.zeros(0)
+            self._event_agents=np.zeros(0,dtype=np.int64)
+            return
+        start,end=self._windows
+        agents=np.flatnonzero(start<end)
+        times=np.concatenate((start[agents],end[agents]))
+        order=np.argsort(times,kind="stable")
+        self._event_times=times[order]
+        self._event_agents=np.concatenate((agents,agents))[order]
+
+    def due(self,tick):
+        '''
+        returns the agents to check in the time step of tick (sorted, they should arrive or leave if
+        their shift state does not match their activity) and a boolean array showing which of them are
+        in their shift: the agents whose shift event is due since the previous call, the agents given to
+        recheck and, in the first step of a day or after check_all, all the agents
+        '''
+        day=tick//DAY_SECONDS
+        t=tick%DAY_SECONDS
+        if day!=self._day:
+            self._plan_day(day)
+            idx=np.arange(self.n)
+            self._next_event=int(np.searchsorted(self._event_times,t,side="right"))
+        else:
+            first=self._next_event
+            if first<len(self._event_times) and self._event_times[first]<=t:
+                self._next_event=int(np.searchsorted(self._event_times,t,side="right"))
+            idx=self._event_agents[first:self._next_event]
+            if len(self._recheck)>0 or len(idx)>1:
+                idx=np.union1d(idx,self._recheck)
+        if self._windows is None or len(idx)==0:
+            return idx,np.zeros(len(idx),dtype=bool)
+        start,end=self._windows
+        return idx,(start[idx]<=t)&(t<end[idx])
+
+    def recheck(self,idx):
+        '''
+        the agents to check again in the next call of due, e.g. the agents whose shift started before
+        they finished leaving; they replace the agents given before, which were all returned by due
+        '''
+        self._recheck=np.asarray(idx,dtype=np.int64)
+
+    def check_all(self):
+        '''
+        makes the next call of due return all the agents, after a change of the agents outside the
+        shift events (e.g. an isolation)
+        '''
+        self._day=None
+
+    def steps_to_next_event(self,tick):
+        '''
+        returns the number of time steps from tick until the first time step in which
+        a shift starts or is in progress, the site closes, a new day starts or the date changes;
+        the time steps before it do not need to be simulated when no agent is in the building
+        '''
+        dt=self.time_step
+        t=tick%DAY_SECONDS
+        steps=[math.ceil((DAY_SECONDS-t)/dt)]
+        if self.is_site_closing(tick):
+            return 0
+        if t<self.site_end:
+            steps.append(math.ceil((self.site_end-t)/dt))
+        if t<=self.day_start and (self.day_start-t)%dt==0:
+            steps.append(round((self.day_start-t)/dt))
+        windows=self.shift_windows(tick)
+        if windows is not None:
+            start,end=windows
+            k=np.ceil(np.maximum(start-t,0)/dt)
+            k=k[t+k*dt<end]
+            if len(k)>0:
+                steps.append(int(k.min()))
+        return max(min(steps),0)